@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def test_settings():
+    """Тесты pytest работают с теми же настройками, что и manage.py test."""
+    from core.testing import test_environment
+
+    with test_environment():
+        yield
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        from . import db  # noqa: F401
+        from .timing import install_template_timing
+
+        install_template_timing()
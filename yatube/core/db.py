@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет PRAGMA к каждому новому соединению с SQLite.
+
+    Набор берётся из ключа PRAGMAS настроек базы, а если его нет —
+    из SQLITE_PRAGMAS.
+    """
+    if connection.vendor != "sqlite":
+        return
+    pragmas = connection.settings_dict.get("PRAGMAS", settings.SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,48 @@
+import re
+
+from django.template.loader import render_to_string
+
+HOLE = re.compile(r"<!--hole:(\w+)((?::[\w.@+-]+)*)-->")
+HOLE_PREFIX = b"<!--hole:"
+
+_renderers = {}
+
+
+def register_hole(name):
+    """Регистрирует функцию, которая заполняет «дыру» `name`.
+
+    Функция получает запрос и аргументы метки и возвращает HTML.
+    """
+    def decorator(func):
+        _renderers[name] = func
+        return func
+    return decorator
+
+
+def hole_marker(name, *args):
+    """Метка на месте зависящего от пользователя фрагмента.
+
+    Страница с метками одинакова для всех и кешируется целиком,
+    а метки заменяются на HTML уже для конкретного запроса.
+    """
+    marker = ":".join([name, *map(str, args)])
+    if not HOLE.fullmatch(f"<!--hole:{marker}-->"):
+        raise ValueError(f"Недопустимая метка: {marker}")
+    return f"<!--hole:{marker}-->"
+
+
+def render_hole_template(request, template_name, context=None):
+    return render_to_string(template_name, context, request=request)
+
+
+def fill_holes(request, content):
+    """Заменяет все метки страницы на HTML для текущего запроса."""
+    def replace(match):
+        args = match.group(2).split(":")[1:]
+        return _renderers[match.group(1)](request, *args)
+    return HOLE.sub(replace, content)
+
+
+@register_hole("header_nav")
+def header_nav(request):
+    return render_hole_template(request, "includes/header_nav.html")
@@ -0,0 +1,80 @@
+import threading
+
+from django.core.signals import request_finished
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(CachedDBStore):
+    """Хранилище метаданных sorl-thumbnail с пакетной загрузкой.
+
+    Записи лежат в БД и в общем кеше, поэтому доступны всем процессам
+    и переживают перезапуск. `prefetch` загружает записи для целой
+    страницы одним запросом; до конца запроса они читаются из памяти.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+        request_finished.connect(self.clear_prefetched, weak=False)
+
+    @property
+    def prefetched(self):
+        if not hasattr(self._local, "values"):
+            self._local.values = {}
+        return self._local.values
+
+    def clear_prefetched(self, **kwargs):
+        self._local.values = {}
+
+    def prefetch(self, image_files):
+        """Загружает записи файлов: из кеша, остальные — одним запросом."""
+        raw_keys = [
+            add_prefix(image_file.key) for image_file in image_files
+            if add_prefix(image_file.key) not in self.prefetched
+        ]
+        if not raw_keys:
+            return
+        values = self.cache.get_many(raw_keys)
+        missing = [key for key in raw_keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list(
+                    "key", "value")
+            )
+            fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        self.prefetched.update(values)
+
+    def cleanup(self):
+        """Как в sorl, но все записи читаются одним запросом."""
+        self.prefetched.update(
+            KVStoreModel.objects.filter(
+                key__startswith=settings.THUMBNAIL_KEY_PREFIX
+            ).values_list("key", "value")
+        )
+        try:
+            super().cleanup()
+        finally:
+            self.clear_prefetched()
+
+    def _get_raw(self, key):
+        if key not in self.prefetched:
+            return super()._get_raw(key)
+        value = self.prefetched[key]
+        if value == EMPTY_VALUE:
+            return None
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.prefetched.pop(key, None)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        for key in keys:
+            self.prefetched.pop(key, None)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+
+def _lock_path(key):
+    """Файл блокировки `key`, если кеш хранится в файлах, иначе None.
+
+    add у FileBasedCache проверяет и записывает файл не атомарно, и
+    два процесса могут одновременно получить True. Блокировка файла
+    (flock) атомарна между процессами и снимается, если процесс упал.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, FileBasedCache) or not locks.LOCK_EX:
+        return None
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(backend._dir, f"{digest}.lock")
+
+
+def acquire_lock(key, timeout):
+    """Захватывает блокировку `key` без ожидания.
+
+    Возвращает значение для release_lock или None, если блокировку
+    держит кто-то другой. `timeout` ограничивает время блокировки
+    в кеше; блокировка файла держится до release_lock или завершения
+    процесса.
+    """
+    path = _lock_path(key)
+    if path is None:
+        return True if cache.add(key, True, timeout) else None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        fd = os.open(path, os.O_CREAT | os.O_WRONLY)
+        try:
+            locks.lock(fd, locks.LOCK_EX | locks.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        # Прежний владелец успел удалить файл: захвачен уже не он.
+        os.close(fd)
+
+
+def release_lock(key, lock):
+    """Снимает блокировку, полученную от acquire_lock."""
+    path = _lock_path(key)
+    if path is None:
+        cache.delete(key)
+        return
+    # Файл удаляется до снятия блокировки: ждущие её процессы заметят,
+    # что их файл удалён, и откроют новый.
+    os.unlink(path)
+    os.close(lock)
+
+
+def is_locked(key):
+    """Держит ли кто-нибудь блокировку `key`."""
+    path = _lock_path(key)
+    if path is None:
+        return bool(cache.get(key))
+    return os.path.exists(path)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.models import KVStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет записи хранилища миниатюр и сами миниатюры для "
+        "исходных файлов, которых больше нет."
+    )
+
+    def handle(self, *args, **options):
+        entries = KVStore.objects.filter(
+            key__startswith=settings.THUMBNAIL_KEY_PREFIX)
+        before = entries.count()
+        default.kvstore.cleanup()
+        self.stdout.write(
+            f"Удалено записей миниатюр: {before - entries.count()}"
+        )
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core.routers import REPLICA, REPLICA_STATE_KEY
+from posts.cache import get_page_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в файл реплики через backup API "
+        "и отмечает, с какой версией кеша страниц реплика совпадает."
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.databases:
+            raise CommandError(
+                "Реплика не настроена: задайте YATUBE_REPLICA.")
+        if connection.vendor != "sqlite":
+            raise CommandError("Команда рассчитана на SQLite.")
+        if connection.in_atomic_block:
+            # Копирование ждало бы конца собственной транзакции вечно.
+            raise CommandError("Команду нельзя запускать в транзакции.")
+        # Время и версия читаются до копирования: изменения во время
+        # копирования её увеличат, а записавшие их сессии будут читать
+        # из основной базы до следующей синхронизации.
+        synced_at = time.time()
+        version = get_page_version()
+        started = time.perf_counter()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections.databases[REPLICA]["NAME"])
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+        cache.set(REPLICA_STATE_KEY, (version, synced_at), None)
+        self.stdout.write(
+            f"Реплика обновлена за {time.perf_counter() - started:.1f} с"
+        )
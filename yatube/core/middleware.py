@@ -0,0 +1,133 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .holes import HOLE_PREFIX, fill_holes
+from .routers import SESSION_KEY, replica_configured, request_writes
+from .timing import RequestTiming, current, time_queries
+
+logger = logging.getLogger("core.timing")
+
+# Категории времени запроса: SQL, шаблоны, поиск миниатюр.
+TIMING_METRICS = ("db", "tpl", "thumb")
+
+
+class HolePunchMiddleware:
+    """Заполняет метки зависящих от пользователя фрагментов.
+
+    Работает и для ответов из кеша страниц, поэтому должен стоять
+    после AuthenticationMiddleware, но вне кеширования страниц.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or not response.get("Content-Type", "").startswith("text/html")
+            or HOLE_PREFIX not in response.content
+        ):
+            return response
+        response.content = fill_holes(
+            request, response.content.decode(response.charset)
+        ).encode(response.charset)
+        if response.has_header("Content-Length"):
+            response["Content-Length"] = str(len(response.content))
+        return response
+
+
+class ServerTimingMiddleware:
+    """Замеряет время SQL, шаблонов и миниатюр и промахи кешей.
+
+    Итоги уходят в заголовок Server-Timing (если включён
+    SERVER_TIMING) и строкой ключ=значение в журнал core.timing.
+    Должен стоять первым, чтобы в замер попали все остальные слои.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = current.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(time_queries))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = timing.total()
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = self.header(timing, total)
+        if logger.isEnabledFor(logging.INFO):
+            self.log(request, response, timing, total)
+        return response
+
+    def caches(self, timing):
+        for name in sorted({name for name, _ in timing.caches}):
+            yield name, timing.caches[name, True], timing.caches[name, False]
+
+    def header(self, timing, total):
+        metrics = []
+        for name in TIMING_METRICS:
+            if name not in timing.durations:
+                continue
+            metric = f"{name};dur={timing.durations[name] * 1000:.1f}"
+            if name == "db":
+                metric += f';desc="{timing.queries} queries"'
+            metrics.append(metric)
+        metrics.extend(
+            f'cache-{name};desc="hit={hits} miss={misses}"'
+            for name, hits, misses in self.caches(timing)
+        )
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def log(self, request, response, timing, total):
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "queries": timing.queries,
+        }
+        for name in TIMING_METRICS:
+            fields[f"{name}_ms"] = round(timing.durations[name] * 1000, 1)
+        for name, hits, misses in self.caches(timing):
+            fields[f"{name}_hits"] = hits
+            fields[f"{name}_misses"] = misses
+        logger.info(
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"timing": fields},
+        )
+
+
+class ReplicaMiddleware:
+    """Запоминает в сессии время её последней записи.
+
+    Пока реплика не скопирована заново, сессия читает из основной
+    базы: иначе пользователь не увидел бы свой новый пост или
+    комментарий. Должен стоять после
+    SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = set()
+        token = request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_writes.reset(token)
+        if writes and replica_configured():
+            request.session[SESSION_KEY] = time.time()
+        return response
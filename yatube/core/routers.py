@@ -0,0 +1,97 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.cache import data_version, get_page_version
+
+REPLICA = "replica"
+# Версия кеша страниц, с которой реплика совпадает, и время начала
+# копирования; их записывает sync_replica.
+REPLICA_STATE_KEY = "core:replica_state"
+# Время последней записи сессии.
+SESSION_KEY = "replica_last_write"
+
+reading = ContextVar("replica_reading", default=False)
+request_writes = ContextVar("replica_request_writes", default=None)
+
+
+def replica_configured():
+    return REPLICA in connections.databases
+
+
+def replica_version(request):
+    """Версия кеша страниц, с которой совпадает реплика, если в этом
+    запросе из неё можно читать, иначе None.
+
+    Сессия, которая что-то записала после начала копирования, читает
+    из основной базы: пользователь сразу видит свои изменения.
+    Остальные читают из реплики, если она совпадает с текущей версией
+    кеша страниц или скопирована не раньше REPLICA_MAX_LAG секунд
+    назад.
+    """
+    if not replica_configured():
+        return None
+    state = cache.get(REPLICA_STATE_KEY)
+    if state is None:
+        return None
+    version, synced_at = state
+    session = getattr(request, "session", None)
+    if session is not None and session.get(SESSION_KEY, 0) >= synced_at:
+        return None
+    if (time.time() - synced_at > settings.REPLICA_MAX_LAG
+            and version != get_page_version()):
+        return None
+    return version
+
+
+def read_from_replica(view):
+    """Представление только читает данные и может читать их из реплики.
+
+    Страницы, посчитанные по отстающей реплике, кеш страниц помечает
+    версией реплики, а не текущей.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = None
+        if request.method in ("GET", "HEAD"):
+            version = replica_version(request)
+        if version is None:
+            return view(request, *args, **kwargs)
+        token = reading.set(True)
+        version_token = data_version.set(version)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            data_version.reset(version_token)
+            reading.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтение в помеченных представлениях — из реплики, остальное —
+    из основной базы.
+
+    Записи запоминаются, чтобы ReplicaMiddleware отправила следующие
+    запросы той же сессии в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return REPLICA if reading.get() else None
+
+    def db_for_write(self, model, **hints):
+        writes = request_writes.get()
+        if writes is not None:
+            writes.add(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В реплике те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит вместе с копией основной базы.
+        return False if db == REPLICA else None
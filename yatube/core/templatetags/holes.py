@@ -0,0 +1,11 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, *args):
+    return mark_safe(hole_marker(name, *args))
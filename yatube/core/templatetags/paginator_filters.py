@@ -0,0 +1,25 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.filter
+def next_cursor(page):
+    return page.paginator.next_cursor(page)
+
+
+@register.filter
+def previous_cursor(page):
+    return page.paginator.previous_cursor(page)
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **params):
+    """Строка запроса ссылки пагинатора с сохранением прочих параметров."""
+    query = context["request"].GET.copy()
+    for key in ("page", "after", "before"):
+        query.pop(key, None)
+    for key, value in params.items():
+        query[key] = str(value)
+    return f"?{query.urlencode()}"
@@ -0,0 +1,29 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.thumbnails import thumbnails_ready
+from core.timing import count_cache
+from posts.cache import card_key, count_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста из кеша фрагментов или заново отрисованная.
+
+    Карточка с исходной картинкой вместо ещё не готовой миниатюры
+    не кешируется.
+    """
+    key = card_key(post)
+    html = cache.get(key)
+    count_card(hit=html is not None)
+    count_cache("card", hit=html is not None)
+    if html is None:
+        html = render_to_string("includes/post_card.html", {"post": post})
+        if thumbnails_ready(post.image):
+            cache.set(key, html, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(html)
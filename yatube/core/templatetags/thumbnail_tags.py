@@ -0,0 +1,11 @@
+from django import template
+
+from core.thumbnails import get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(file_, name):
+    """Готовая миниатюра или None, пока она создаётся в фоне."""
+    return get_ready_thumbnail(file_, name)
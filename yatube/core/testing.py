@@ -0,0 +1,48 @@
+import logging
+from contextlib import ExitStack, contextmanager
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Настройки, с которыми работают тесты. Тесты очищают кеш, поэтому у них
+# свой кеш в памяти процесса, а не общий файловый кеш сайта. Миниатюры
+# создаются в потоке теста: фоновый поток писал бы в базу и MEDIA_ROOT,
+# пока их очищают после теста.
+TEST_SETTINGS = {
+    "THUMBNAIL_WORKERS": 0,
+    "CACHES": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "yatube-tests",
+        },
+    },
+}
+
+
+@contextmanager
+def test_environment():
+    """Настройки TEST_SETTINGS и журнал core без строк на каждый запрос.
+
+    Тесты, проверяющие журнал, включают его через assertLogs.
+    """
+    logger = logging.getLogger("core")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with override_settings(**TEST_SETTINGS):
+            yield
+    finally:
+        logger.setLevel(level)
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты manage.py test в test_environment."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_environment = ExitStack()
+        self.test_environment.enter_context(test_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_environment.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.dispatch import Signal
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "thumbnails:pending:{}"
+# Пока ключ жив, миниатюра не ставится в очередь повторно — в том числе
+# после ошибки, чтобы битый исходник не нагружал пул на каждом просмотре.
+PENDING_TIMEOUT = 5 * 60
+
+# Миниатюра создана: страницы, где вместо неё был исходник, устарели.
+thumbnail_ready = Signal(providing_args=["file_"])
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class InlineExecutor:
+    """Выполняет задачу сразу, в текущем потоке (THUMBNAIL_WORKERS = 0)."""
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+def get_executor():
+    """Исполнитель генерации миниатюр по THUMBNAIL_WORKERS.
+
+    Пул создаётся при первой задаче, а не при импорте модуля, поэтому
+    учитываются настройки, действующие в этот момент.
+    """
+    global _pool
+    if not settings.THUMBNAIL_WORKERS:
+        return InlineExecutor()
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails",
+            )
+    return _pool
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры, дополненные так же, как это делает sorl."""
+    options = dict(options)
+    backend = default.backend
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault("format", backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def get_thumbnail_file(file_, name):
+    """Геометрия, опции и ImageFile миниатюры для геометрии `name`.
+
+    Файл и Pillow не трогаются: имя миниатюры вычисляется по ключу
+    исходника.
+    """
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    source = ImageFile(file_)
+    options = thumbnail_options(source, options)
+    thumbnail = ImageFile(
+        default.backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+    return geometry, options, thumbnail
+
+
+def get_ready_thumbnail(file_, name):
+    """Готовая миниатюра для геометрии `name` или None.
+
+    Наличие проверяется в хранилище метаданных sorl; отсутствующая
+    миниатюра ставится в очередь фоновой генерации.
+    """
+    if not file_:
+        return None
+    with timed("thumb"):
+        geometry, options, thumbnail = get_thumbnail_file(file_, name)
+        cached = default.kvstore.get(thumbnail)
+        if cached is None:
+            enqueue_thumbnail(file_, geometry, options, thumbnail.key)
+    return cached
+
+
+def thumbnails_ready(file_):
+    """Готовы ли все миниатюры файла (или картинки нет вовсе)."""
+    return all(
+        get_ready_thumbnail(file_, name) is not None
+        for name in settings.THUMBNAIL_GEOMETRIES
+    ) if file_ else True
+
+
+def prefetch_thumbnails(files):
+    """Загружает метаданные всех миниатюр набора файлов одним запросом."""
+    with timed("thumb"):
+        default.kvstore.prefetch(
+            get_thumbnail_file(file_, name)[2]
+            for file_ in files if file_
+            for name in settings.THUMBNAIL_GEOMETRIES
+        )
+
+
+def enqueue_thumbnail(file_, geometry, options, key):
+    """После коммита ставит генерацию в очередь.
+
+    Генерацию ставит только тот процесс, которому удалось занять ключ
+    в общем кеше.
+    """
+    pending_key = PENDING_KEY.format(key)
+
+    def submit():
+        if cache.add(pending_key, True, PENDING_TIMEOUT):
+            executor = get_executor()
+            executor.submit(
+                generate_thumbnail, file_, geometry, options,
+                in_pool=not isinstance(executor, InlineExecutor),
+            )
+
+    transaction.on_commit(submit)
+
+
+def generate_thumbnail(file_, geometry, options, in_pool=False):
+    started = time.perf_counter()
+    try:
+        default.backend.get_thumbnail(file_, geometry, **options)
+        logger.info(
+            "thumbnail file=%s geometry=%s ms=%.1f", file_, geometry,
+            (time.perf_counter() - started) * 1000,
+        )
+        thumbnail_ready.send(sender=None, file_=file_)
+    except Exception:
+        logger.exception("Не удалось создать миниатюру для %s", file_)
+    finally:
+        # Соединение потока пула иначе осталось бы открытым.
+        if in_pool:
+            connection.close()
+
+
+def schedule_thumbnails(file_):
+    """Ставит в очередь все миниатюры, которые нужны шаблонам."""
+    for name in settings.THUMBNAIL_GEOMETRIES:
+        get_ready_thumbnail(file_, name)
@@ -0,0 +1,83 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.base import Template
+
+current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Время по категориям, число запросов и попадания в кеши."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = Counter()
+        self.queries = 0
+        self.caches = Counter()
+        self.template_depth = 0
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время блока к категории `name` текущего запроса."""
+    timing = current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.durations[name] += time.perf_counter() - started
+
+
+def count_cache(name, hit):
+    """Учитывает попадание или промах кеша `name` в текущем запросе."""
+    timing = current.get()
+    if timing is not None:
+        timing.caches[name, hit] += 1
+
+
+def time_queries(execute, sql, params, many, context):
+    """Обёртка выполнения SQL для connection.execute_wrapper."""
+    timing = current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.durations["db"] += time.perf_counter() - started
+        timing.queries += 1
+
+
+def install_template_timing():
+    """Считает время отрисовки шаблонов верхнего уровня.
+
+    Вложенные include и шаблоны тегов уже входят во время внешнего
+    шаблона и отдельно не складываются.
+    """
+    original = Template.render
+    if getattr(original, "timed", False):
+        return
+
+    def render(self, context):
+        timing = current.get()
+        if timing is None:
+            return original(self, context)
+        timing.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            timing.template_depth -= 1
+            if not timing.template_depth:
+                timing.durations["tpl"] += time.perf_counter() - started
+
+    render.timed = True
+    Template.render = render
@@ -0,0 +1,291 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, quote_etag
+
+from core.locks import acquire_lock, is_locked, release_lock
+from core.timing import count_cache
+
+PAGE_VERSION_KEY = "posts:page_version"
+PAGE_VERSION_LOCK_KEY = "posts:page_version_lock"
+PAGE_KEY = "posts:page:{}"
+PAGE_LOCK_KEY = "posts:page_lock:{}"
+PAGE_REPLACED_KEY = "posts:page_replaced:{}"
+PAGE_DISCARDED_KEY = "posts:page_discarded"
+# Дольше пересчёт страницы не ждут, и столько же после устаревания
+# отдают её прежнюю версию.
+PAGE_LOCK_TIMEOUT = 30
+PAGE_WAIT_TIMEOUT = 5
+PAGE_WAIT_INTERVAL = 0.05
+# Увеличивается при изменении разметки includes/post_card.html.
+CARD_TEMPLATE_VERSION = 2
+CARD_KEY = "posts:card:{}:{}"
+CARD_METRICS_KEY = "posts:card_metrics:{}"
+CARD_METRICS_FLUSH = 50
+
+# Версия кеша страниц, которой соответствуют читаемые данные, если они
+# старше текущей: так бывает при чтении из отстающей реплики.
+data_version = ContextVar("page_data_version", default=None)
+
+_card_metrics = Counter()
+_card_metrics_lock = threading.Lock()
+
+
+def new_page_version():
+    return uuid.uuid4().hex
+
+
+def get_page_version():
+    """Текущая версия кеша страниц с постами.
+
+    Первую версию записывает запрос с блокировкой: add у
+    FileBasedCache не атомарен, и одновременные запросы записали бы
+    разные версии и не узнали бы страниц друг друга.
+    """
+    version = cache.get(PAGE_VERSION_KEY)
+    deadline = time.monotonic() + PAGE_WAIT_TIMEOUT
+    while version is None:
+        lock = acquire_lock(PAGE_VERSION_LOCK_KEY, PAGE_LOCK_TIMEOUT)
+        if lock is not None:
+            try:
+                cache.add(PAGE_VERSION_KEY, new_page_version(), None)
+            finally:
+                release_lock(PAGE_VERSION_LOCK_KEY, lock)
+        elif time.monotonic() < deadline:
+            time.sleep(PAGE_WAIT_INTERVAL)
+        else:
+            return new_page_version()
+        version = cache.get(PAGE_VERSION_KEY)
+    return version
+
+
+def bump_page_version(discard=False):
+    """Делает недействительными все закешированные страницы.
+
+    Версия — случайная строка, а не счётчик: incr у FileBasedCache
+    читает и перезаписывает файл неатомарно, и из двух одновременных
+    увеличений одно терялось. Новая случайная версия отличается от
+    любой прочитанной раньше, чья бы запись ни оказалась последней, а
+    вытесненный из кеша ключ не начинает счёт заново с уже
+    использованного значения.
+
+    Время замены версии ограничивает отдачу устаревших страниц.
+    `discard` — изменение убрало пост со страниц: посчитанные до него
+    страницы больше не отдаются даже во время пересчёта.
+    """
+    now = time.time()
+    replaced = cache.get(PAGE_VERSION_KEY)
+    if replaced is not None:
+        cache.add(PAGE_REPLACED_KEY.format(replaced), now, PAGE_LOCK_TIMEOUT)
+    if discard:
+        cache.set(PAGE_DISCARDED_KEY, now, PAGE_LOCK_TIMEOUT)
+    cache.set(PAGE_VERSION_KEY, new_page_version(), None)
+
+
+def versioned_cache_page(timeout, etag_func=None):
+    """Кеш страниц с отдачей устаревшей версии во время пересчёта.
+
+    Запись страницы помнит версию кеша страниц (её увеличивают
+    сигналы при изменении постов, комментариев и групп) и время
+    устаревания. Устаревшую страницу пересчитывает только запрос,
+    захвативший блокировку (она атомарна и между процессами, см.
+    core.locks), а остальные в это время получают предыдущую версию,
+    но не дольше PAGE_LOCK_TIMEOUT с момента устаревания (см.
+    can_serve_stale). Иначе, как и без страницы в
+    кеше, запросы без блокировки ждут, пока её посчитает первый.
+
+    `etag_func(request, version)` даёт ETag по версии, с которой
+    посчитана отданная страница: с ETag текущей версии браузер
+    подтверждал бы устаревшую страницу ответом 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = PAGE_KEY.format(digest)
+            lock_key = PAGE_LOCK_KEY.format(digest)
+            created = time.time()
+            version = get_page_version()
+            entry = cache.get(key)
+            if is_fresh(entry, version):
+                count_cache("page", hit=True)
+                return client_response(
+                    request, entry["response"], entry["version"], etag_func)
+            lock = acquire_lock(lock_key, PAGE_LOCK_TIMEOUT)
+            if lock is not None:
+                # Страницу мог посчитать запрос, только что снявший
+                # блокировку.
+                entry = cache.get(key)
+                if is_fresh(entry, version):
+                    release_lock(lock_key, lock)
+                    count_cache("page", hit=True)
+                    return client_response(
+                        request, entry["response"], entry["version"],
+                        etag_func)
+            else:
+                # Страницу уже пересчитывает другой запрос.
+                if not can_serve_stale(entry, version):
+                    entry = wait_for_page(key, lock_key, version)
+                if entry is not None:
+                    count_cache("page", hit=True)
+                    return client_response(
+                        request, entry["response"], entry["version"],
+                        etag_func)
+            count_cache("page", hit=False)
+            # Страница из старых данных не должна стать текущей.
+            version = data_version.get() or version
+            try:
+                response = view(request, *args, **kwargs)
+                store_page(key, response, version, created, timeout)
+            finally:
+                if lock is not None:
+                    release_lock(lock_key, lock)
+            return client_response(request, response, version, etag_func)
+        return wrapper
+    return decorator
+
+
+def is_fresh(entry, version):
+    return (
+        entry is not None
+        and entry["version"] == version
+        and entry["expires"] > time.time()
+    )
+
+
+def can_serve_stale(entry, version):
+    """Можно ли отдать устаревшую запись, пока её пересчитывают.
+
+    Запись отдаётся не дольше PAGE_LOCK_TIMEOUT с момента, когда она
+    истекла или её версию заменили, и никогда — если после её расчёта
+    удалили пост. Без записи о замене версии запись не отдаётся.
+    """
+    if entry is None:
+        return False
+    replaced = PAGE_REPLACED_KEY.format(entry["version"])
+    times = cache.get_many([replaced, PAGE_DISCARDED_KEY])
+    stale_since = entry["expires"]
+    if entry["version"] != version:
+        stale_since = min(stale_since, times.get(replaced, 0))
+    return (
+        times.get(PAGE_DISCARDED_KEY, 0) < entry["created"]
+        and time.time() - stale_since < PAGE_LOCK_TIMEOUT
+    )
+
+
+def wait_for_page(key, lock_key, version):
+    """Ждёт страницу, которую считает запрос с блокировкой."""
+    deadline = time.monotonic() + PAGE_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(PAGE_WAIT_INTERVAL)
+        # Блокировка проверяется до чтения страницы: иначе пересчёт мог
+        # закончиться между ними, и его страница осталась бы незамеченной.
+        released = not is_locked(lock_key)
+        entry = cache.get(key)
+        if is_fresh(entry, version):
+            return entry
+        if released:
+            # Пересчёт закончился, но версию успели заменить ещё раз.
+            return entry if can_serve_stale(entry, version) else None
+    return None
+
+
+def store_page(key, response, version, created, timeout):
+    """Сохраняет страницу с версией, прочитанной до её расчёта."""
+    if response.status_code != 200 or response.cookies:
+        return
+    entry = {
+        "version": version,
+        "created": created,
+        "expires": time.time() + timeout,
+        "response": response,
+    }
+
+    def store(response):
+        cache.set(key, entry, timeout + PAGE_LOCK_TIMEOUT)
+
+    if hasattr(response, "add_post_render_callback"):
+        response.add_post_render_callback(store)
+    else:
+        store(response)
+
+
+def client_response(request, response, version, etag_func):
+    if etag_func is not None:
+        response["ETag"] = quote_etag(etag_func(request, version))
+    # Браузер перепроверяет страницу по ETag, а не хранит её у себя.
+    patch_cache_control(response, no_cache=True, max_age=0)
+    return response
+
+
+def card_key(post):
+    """Ключ карточки поста: id и отпечаток всех показанных в ней полей.
+
+    Правка поста, переименование автора, смена адреса группы или
+    новый комментарий дают
+    новый ключ, поэтому карточки не нужно сбрасывать сигналами.
+    """
+    fingerprint = repr((
+        CARD_TEMPLATE_VERSION,
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else None,
+        post.comments_count,
+    ))
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    return CARD_KEY.format(post.pk, digest)
+
+
+def count_card(hit):
+    """Учитывает попадание в кеш карточек или промах.
+
+    Счётчики копятся в памяти процесса и переносятся в общий кеш
+    пачками, чтобы не писать в кеш на каждую карточку.
+    """
+    with _card_metrics_lock:
+        _card_metrics["hits" if hit else "misses"] += 1
+        if sum(_card_metrics.values()) < CARD_METRICS_FLUSH:
+            return
+        pending = dict(_card_metrics)
+        _card_metrics.clear()
+    _store_card_metrics(pending)
+
+
+def _store_card_metrics(pending):
+    for name, value in pending.items():
+        key = CARD_METRICS_KEY.format(name)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+
+def get_card_metrics():
+    """Попадания и промахи кеша карточек во всех процессах."""
+    with _card_metrics_lock:
+        pending = dict(_card_metrics)
+        _card_metrics.clear()
+    _store_card_metrics(pending)
+    return {
+        name: cache.get(CARD_METRICS_KEY.format(name), 0)
+        for name in ("hits", "misses")
+    }
+
+
+def reset_card_metrics():
+    with _card_metrics_lock:
+        _card_metrics.clear()
+    cache.delete_many(
+        [CARD_METRICS_KEY.format(name) for name in ("hits", "misses")])
@@ -0,0 +1,61 @@
+import hashlib
+
+from .cache import get_page_version
+from .models import Post
+
+
+def viewer_key(request):
+    """Зритель страницы: от него зависят шапка и кнопки."""
+    if request.user.is_authenticated:
+        return request.user.pk
+    return "anonymous"
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def page_etag(request, version):
+    """ETag ленты: версия кеша страниц, зритель и адрес с параметрами."""
+    return make_etag(version, viewer_key(request), request.get_full_path())
+
+
+def feed_etag(request, *args, **kwargs):
+    """ETag текущей версии ленты.
+
+    Версия увеличивается сигналами при любом изменении, видимом в
+    лентах, и читается из кеша без запросов к базе.
+    """
+    return page_etag(request, get_page_version())
+
+
+def post_state(request, post_id):
+    """Всё, что видно на странице поста, одним запросом к базе."""
+    if not hasattr(request, "_post_state"):
+        request._post_state = Post.objects.filter(pk=post_id).values_list(
+            "updated_at",
+            "comments_count",
+            "comments_updated_at",
+            "author__first_name",
+            "author__last_name",
+            "author__stats__posts_count",
+            "group__title",
+            "group__slug",
+        ).first()
+    return request._post_state
+
+
+def post_detail_etag(request, post_id):
+    """ETag страницы поста: `?after=` выбирает порцию комментариев."""
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    return make_etag(viewer_key(request), request.get_full_path(), *state)
+
+
+def post_comments_etag(request, post_id):
+    """ETag порции комментариев: от зрителя она не зависит."""
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    return make_etag(request.get_full_path(), *state)
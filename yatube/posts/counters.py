@@ -0,0 +1,62 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Comment, Group, Post, UserStats
+
+
+def get_posts_count(user):
+    """Количество постов автора по счётчику, без COUNT(*)."""
+    stats = getattr(user, "stats", None)
+    return stats.posts_count if stats else 0
+
+
+def change_author_posts(author_id, delta):
+    """Меняет счётчик постов автора.
+
+    Строка счётчика создаётся только при добавлении поста: при
+    удалении пользователя его UserStats удаляется раньше постов, и
+    новая строка ссылалась бы на удаляемого пользователя.
+    """
+    stats = UserStats.objects.filter(user_id=author_id)
+    if delta < 0:
+        stats = stats.filter(posts_count__gte=-delta)
+    if stats.update(posts_count=F("posts_count") + delta):
+        return
+    posts_count = Post.objects.filter(author_id=author_id).count()
+    if delta > 0:
+        UserStats.objects.update_or_create(
+            user_id=author_id, defaults={"posts_count": posts_count})
+    else:
+        UserStats.objects.filter(user_id=author_id).update(
+            posts_count=posts_count)
+
+
+def change_group_posts(group_id, delta):
+    if group_id is None:
+        return
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    if not groups.update(posts_count=F("posts_count") + delta):
+        Group.objects.filter(pk=group_id).update(
+            posts_count=Post.objects.filter(group_id=group_id).count()
+        )
+
+
+def change_post_comments(post_id, delta):
+    """Меняет счётчик комментариев поста и время их изменения.
+
+    `delta` равна нулю, когда комментарий отредактирован.
+    """
+    if post_id is None:
+        return
+    now = timezone.now()
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    if not posts.update(comments_count=F("comments_count") + delta,
+                        comments_updated_at=now):
+        Post.objects.filter(pk=post_id).update(
+            comments_count=Comment.objects.filter(post_id=post_id).count(),
+            comments_updated_at=now,
+        )
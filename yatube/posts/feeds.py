@@ -0,0 +1,198 @@
+import heapq
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .follows import get_followers_counts, get_following_ids
+from .models import FeedItem, Follow, Post
+from .utils import chunked
+
+# Сколько элементов лент создаётся одним INSERT: генераторы не
+# собираются в памяти целиком, как это сделал бы bulk_create.
+FEED_BATCH_SIZE = 1000
+# Порядок ленты подписок: ключ индекса FeedItem(user, -pub_date, -post).
+FOLLOW_FEED_ORDERING = ("-feed_pub_date", "-feed_post_id")
+
+
+def is_celebrity(author_id):
+    """Автор, у которого подписчиков больше FEED_FANOUT_LIMIT."""
+    return author_id in celebrity_ids([author_id])
+
+
+def celebrity_ids(author_ids):
+    """Из списка авторов выбирает тех, чьи посты читаются без раздачи."""
+    counts = get_followers_counts(author_ids)
+    return [author_id for author_id in author_ids
+            if counts[author_id] > settings.FEED_FANOUT_LIMIT]
+
+
+def insert_feed_items(items):
+    """Записывает элементы лент пачками по FEED_BATCH_SIZE."""
+    for batch in chunked(items, FEED_BATCH_SIZE):
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Раздаёт новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list("user_id", flat=True)
+    insert_feed_items(
+        FeedItem(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет посты автора в ленту нового подписчика."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).values_list("id", "pub_date")
+    insert_feed_items(
+        FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def fan_out_authors(author_ids):
+    """Раздаёт все посты авторов их подписчикам одним INSERT … SELECT.
+
+    Строки лент не проходят через Python: база сама соединяет подписки
+    с постами. Уже существующие элементы лент пропускаются.
+    """
+    feed, follow, post = (
+        model._meta for model in (FeedItem, Follow, Post))
+    quote = connection.ops.quote_name
+
+    def column(opts, name):
+        return "{}.{}".format(
+            quote(opts.db_table), quote(opts.get_field(name).column))
+
+    sql = (
+        "{insert} {feed} ({user}, {post}, {pub_date}) "
+        "SELECT {follow_user}, {post_id}, {post_pub_date} "
+        "FROM {follow} INNER JOIN {post_table} "
+        "ON {post_author} = {follow_author} "
+        "WHERE {follow_author} IN ({authors}) "
+        "AND {follow_user} IS NOT NULL{suffix}"
+    ).format(
+        insert=connection.ops.insert_statement(ignore_conflicts=True),
+        feed=quote(feed.db_table),
+        user=quote(feed.get_field("user").column),
+        post=quote(feed.get_field("post").column),
+        pub_date=quote(feed.get_field("pub_date").column),
+        follow_user=column(follow, "user"),
+        post_id=column(post, "id"),
+        post_pub_date=column(post, "pub_date"),
+        follow=quote(follow.db_table),
+        post_table=quote(post.db_table),
+        post_author=column(post, "author"),
+        follow_author=column(follow, "author"),
+        authors=", ".join(["%s"] * len(author_ids)),
+        suffix=connection.ops.ignore_conflicts_suffix_sql(
+            ignore_conflicts=True),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, list(author_ids))
+
+
+def backfill_author(author_id):
+    """Раздаёт все посты автора его подписчикам.
+
+    Нужна, когда автор перестаёт быть знаменитостью: посты, написанные
+    им до этого, по лентам не раздавались. Подписчиков в этот момент
+    не больше FEED_FANOUT_LIMIT.
+    """
+    fan_out_authors([author_id])
+
+
+def prune_feed(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+class MergedFeed:
+    """Лента из нескольких упорядоченных одинаково наборов постов.
+
+    Умеет то, что нужно KeysetPaginator: сортировку, фильтр по
+    курсору, обратный порядок и срез. Каждый набор читается своим
+    диапазоном индекса с тем же условием и LIMIT, а строки сливаются
+    в Python, поэтому общий запрос с OR и сортировкой не нужен.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets, ordering=FOLLOW_FEED_ORDERING):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def _clone(self, method, *args, **kwargs):
+        return MergedFeed(
+            [getattr(queryset, method)(*args, **kwargs)
+             for queryset in self.querysets],
+            self.ordering,
+        )
+
+    def for_feed(self):
+        return self._clone("for_feed")
+
+    def filter(self, *args, **kwargs):
+        return self._clone("filter", *args, **kwargs)
+
+    def order_by(self, *ordering):
+        feed = self._clone("order_by", *ordering)
+        feed.ordering = ordering
+        return feed
+
+    def reverse(self):
+        feed = self._clone("reverse")
+        feed.ordering = tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+        return feed
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.stop is None:
+            raise TypeError("Ленту можно только срезать до конца страницы.")
+        key = attrgetter(*(field.lstrip("-") for field in self.ordering))
+        rows = heapq.merge(
+            *(queryset[:index.stop] for queryset in self.querysets),
+            key=key,
+            reverse=self.ordering[0].startswith("-"),
+        )
+        return list(rows)[index.start:index.stop]
+
+
+def get_follow_feed(user):
+    """Посты авторов, на которых подписан пользователь.
+
+    Основная часть читается из материализованной ленты диапазоном по
+    индексу FeedItem(user, -pub_date, -post), а посты каждого автора с
+    огромным числом подписчиков — своим диапазоном по индексу постов
+    автора. Наборы сливаются в порядке FOLLOW_FEED_ORDERING.
+    """
+    celebrities = celebrity_ids(list(get_following_ids(user.id)))
+    feed = Post.objects.filter(feed_items__user=user).annotate(
+        feed_pub_date=F("feed_items__pub_date"),
+        feed_post_id=F("feed_items__post_id"),
+    )
+    if not celebrities:
+        return feed
+    # Посты, розданные, пока автор ещё не был знаменитостью, читаются
+    # из его собственного диапазона.
+    querysets = [feed.exclude(author_id__in=celebrities)]
+    querysets += [
+        Post.objects.filter(author_id=author_id).annotate(
+            feed_pub_date=F("pub_date"), feed_post_id=F("id"))
+        for author_id in sorted(celebrities)
+    ]
+    return MergedFeed(querysets)
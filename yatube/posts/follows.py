@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+
+from .models import Follow
+
+FOLLOWING_KEY = "follows:following:{}"
+FOLLOWERS_COUNT_KEY = "follows:followers_count:{}"
+# Записи сбрасываются сигналами при подписке и отписке. Граф читается
+# из основной базы: прочитанный из отстающей реплики, он остался бы в
+# кеше до следующей подписки.
+FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+
+
+def get_following_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    key = FOLLOWING_KEY.format(user_id)
+    following = cache.get(key)
+    if following is None:
+        follows = Follow.objects.using(DEFAULT_DB_ALIAS)
+        following = frozenset(follows.filter(
+            user_id=user_id).values_list("author_id", flat=True))
+        cache.set(key, following, FOLLOW_GRAPH_TIMEOUT)
+    return following
+
+
+def is_following(user_id, author_id):
+    return author_id in get_following_ids(user_id)
+
+
+def get_followers_counts(author_ids):
+    """Число подписчиков каждого автора; промахи кеша — одним запросом."""
+    keys = {FOLLOWERS_COUNT_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    counts = {keys[key]: count
+              for key, count in cache.get_many(keys).items()}
+    missing = [author_id for author_id in keys.values()
+               if author_id not in counts]
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        fresh.update(
+            Follow.objects.using(DEFAULT_DB_ALIAS)
+            .filter(author_id__in=missing)
+            .values("author_id")
+            .annotate(followers=Count("pk"))
+            .values_list("author_id", "followers")
+        )
+        cache.set_many(
+            {FOLLOWERS_COUNT_KEY.format(author_id): count
+             for author_id, count in fresh.items()},
+            FOLLOW_GRAPH_TIMEOUT,
+        )
+        counts.update(fresh)
+    return counts
+
+
+def invalidate_follows(user_id, author_id):
+    """Сбрасывает подписки читателя и число подписчиков автора.
+
+    Повторный сброс после коммита не даёт параллельному запросу
+    положить в кеш граф, прочитанный до коммита.
+    """
+    keys = [FOLLOWING_KEY.format(user_id),
+            FOLLOWERS_COUNT_KEY.format(author_id)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 
-from .models import Comment, Post
+from .images import IMAGE_ERRORS, ingest_image
+from .models import Comment, Group, Post
 
 
 class PostForm(forms.ModelForm):
@@ -8,8 +10,41 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ("text", "group", "image")
 
+    def clean_image(self):
+        """Уменьшает и перекодирует новую картинку, запоминает размеры."""
+        image = self.cleaned_data["image"]
+        if "image" not in self.changed_data:
+            return image
+        if not image:
+            self.instance.image_width = self.instance.image_height = None
+            self.instance.image_original = None
+            return image
+        try:
+            ingested, width, height = ingest_image(image)
+        except IMAGE_ERRORS:
+            raise forms.ValidationError(
+                "Не удалось прочитать картинку: файл повреждён.",
+                code="invalid_image",
+            )
+        if settings.IMAGE_KEEP_ORIGINAL and ingested is not image:
+            self.instance.image_original = image
+        self.instance.image_width = width
+        self.instance.image_height = height
+        return ingested
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ("text",)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label="Найти", max_length=200)
+    author = forms.CharField(label="Автор", max_length=150, required=False)
+    group = forms.ModelChoiceField(
+        label="Группа",
+        queryset=Group.objects.all(),
+        to_field_name="slug",
+        required=False,
+    )
@@ -0,0 +1,43 @@
+from core.holes import register_hole, render_hole_template
+
+from .follows import is_following
+from .forms import CommentForm
+
+
+@register_hole("follow_button")
+def follow_button(request, username, author_id):
+    user = request.user
+    if not user.is_authenticated or user.username == username:
+        return ""
+    following = is_following(user.id, int(author_id))
+    return render_hole_template(
+        request,
+        "posts/includes/follow_button.html",
+        {"username": username, "following": following},
+    )
+
+
+@register_hole("switcher")
+def switcher(request):
+    if not request.user.is_authenticated:
+        return ""
+    return render_hole_template(request, "posts/includes/switcher.html")
+
+
+@register_hole("post_actions")
+def post_actions(request, post_id, author_id):
+    if str(request.user.pk) != author_id:
+        return ""
+    return render_hole_template(
+        request, "posts/includes/post_actions.html", {"post_id": post_id})
+
+
+@register_hole("comment_form")
+def comment_form(request, post_id):
+    if not request.user.is_authenticated:
+        return ""
+    return render_hole_template(
+        request,
+        "posts/includes/comment_form.html",
+        {"post_id": post_id, "form": CommentForm()},
+    )
@@ -0,0 +1,85 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "WEBP": "webp",
+}
+# Ошибки Pillow на повреждённых и слишком больших картинках: проверку
+# ImageField такие файлы проходят, а падают при декодировании.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+# Длительность кадра анимации, если в файле её нет, мс.
+DEFAULT_FRAME_DURATION = 100
+
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def ingest_image(uploaded):
+    """Готовит загруженную картинку к хранению.
+
+    Картинка поворачивается по EXIF, уменьшается до IMAGE_MAX_SIZE и
+    перекодируется в IMAGE_FORMAT без метаданных. Исходный файл
+    остаётся, если он не больше и не содержит EXIF. Анимация всегда
+    перекодируется в IMAGE_ANIMATED_FORMAT. Возвращает файл, ширину
+    и высоту.
+    """
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        if getattr(image, "is_animated", False):
+            return ingest_animation(image, uploaded.name)
+        has_exif = bool(image.getexif())
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+    max_width, max_height = settings.IMAGE_MAX_SIZE
+    resized = image.width > max_width or image.height > max_height
+    image.thumbnail(settings.IMAGE_MAX_SIZE, Image.LANCZOS)
+    image = image.convert("RGBA" if has_alpha(image) else "RGB")
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        settings.IMAGE_FORMAT,
+        quality=settings.IMAGE_QUALITY,
+        icc_profile=icc_profile,
+    )
+    if not resized and not has_exif and buffer.tell() >= uploaded.size:
+        uploaded.seek(0)
+        return uploaded, image.width, image.height
+    name = os.path.splitext(os.path.basename(uploaded.name))[0]
+    extension = EXTENSIONS[settings.IMAGE_FORMAT]
+    content = ContentFile(buffer.getvalue(), name=f"{name}.{extension}")
+    return content, image.width, image.height
+
+
+def ingest_animation(image, name):
+    """Уменьшает все кадры анимации до IMAGE_MAX_SIZE и перекодирует её
+    в IMAGE_ANIMATED_FORMAT без метаданных, сохраняя длительности."""
+    size = image.copy()
+    size.thumbnail(settings.IMAGE_MAX_SIZE)
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get("duration", DEFAULT_FRAME_DURATION))
+        frames.append(frame.convert("RGBA").resize(size.size, Image.LANCZOS))
+    buffer = BytesIO()
+    frames[0].save(
+        buffer,
+        settings.IMAGE_ANIMATED_FORMAT,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=image.info.get("loop", 0),
+        quality=settings.IMAGE_QUALITY,
+    )
+    name = os.path.splitext(os.path.basename(name))[0]
+    extension = EXTENSIONS[settings.IMAGE_ANIMATED_FORMAT]
+    content = ContentFile(buffer.getvalue(), name=f"{name}.{extension}")
+    return content, size.width, size.height
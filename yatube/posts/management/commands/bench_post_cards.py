@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+
+from posts.cache import card_key, get_card_metrics
+from posts.models import Post
+
+PAGE_TEMPLATE = (
+    "{% for post in posts %}{% include 'includes/post.html' %}{% endfor %}"
+)
+UNCACHED_TEMPLATE = (
+    "{% for post in posts %}{% include 'includes/post_card.html' %}"
+    "{% if not forloop.last %}<hr>{% endif %}{% endfor %}"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время отрисовки страницы ленты без кеша карточек, "
+        "с холодным и с тёплым кешем."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--page-size", type=int, default=settings.COUNT_POST_IN_LIST)
+
+    def measure(self, template, posts, repeat, before=None):
+        elapsed = 0
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            template.render({"posts": posts})
+            elapsed += time.perf_counter() - started
+        return elapsed / repeat * 1000
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.for_feed()[:options["page_size"]])
+        if not posts:
+            raise CommandError("Нет постов для отрисовки.")
+        engine = engines["django"]
+        page = engine.from_string(PAGE_TEMPLATE)
+        keys = [card_key(post) for post in posts]
+        repeat = options["repeat"]
+        before = get_card_metrics()
+        results = (
+            ("без кеша", self.measure(
+                engine.from_string(UNCACHED_TEMPLATE), posts, repeat)),
+            ("холодный кеш", self.measure(
+                page, posts, repeat, lambda: cache.delete_many(keys))),
+            ("тёплый кеш", self.measure(page, posts, repeat)),
+        )
+        for name, elapsed in results:
+            self.stdout.write(f"{name}: {elapsed:.2f} мс на страницу")
+        after = get_card_metrics()
+        hits = after["hits"] - before["hits"]
+        misses = after["misses"] - before["misses"]
+        self.stdout.write(
+            f"Карточек из кеша: {hits}, отрисовано: {misses}"
+        )
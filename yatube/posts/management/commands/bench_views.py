@@ -0,0 +1,232 @@
+import json
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.template.base import Template
+from django.test import Client
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Group, Post, User
+
+URL_MODULES = ("posts.urls", "users.urls", "about.urls")
+# GET этих адресов меняет состояние: подписки или сессию клиента.
+SKIPPED_VIEWS = {
+    "posts:profile_follow",
+    "posts:profile_unfollow",
+    "users:logout",
+}
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+@contextmanager
+def query_timer():
+    """Считает SQL-запросы и время их выполнения."""
+    timer = {"count": 0, "elapsed": 0.0}
+
+    def execute(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timer["count"] += 1
+            timer["elapsed"] += time.perf_counter() - started
+
+    with connection.execute_wrapper(execute):
+        yield timer
+
+
+@contextmanager
+def template_timer():
+    """Считает время отрисовки шаблонов верхнего уровня.
+
+    Вложенные include уже входят во время внешнего шаблона, а запросы
+    ленивых QuerySet'ов, выполненные при отрисовке, — и во время SQL.
+    """
+    timer = {"depth": 0, "elapsed": 0.0}
+    original = Template.render
+
+    def render(template, context):
+        timer["depth"] += 1
+        started = time.perf_counter()
+        try:
+            return original(template, context)
+        finally:
+            timer["depth"] -= 1
+            if not timer["depth"]:
+                timer["elapsed"] += time.perf_counter() - started
+
+    Template.render = render
+    try:
+        yield timer
+    finally:
+        Template.render = original
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку, SQL-запросы и отрисовку шаблонов каждого "
+        "адреса posts, users и about на заполненной базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--warm-cache", action="store_true",
+            help="Не очищать кеш перед каждым запросом.")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Очищать кеш, даже если он общий с работающим сайтом.")
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument(
+            "--compare", help="JSON прошлого запуска для сравнения.")
+        parser.add_argument(
+            "--threshold", type=float, default=0.2,
+            help="Допустимый рост p95, доля от прошлого значения.")
+        parser.add_argument(
+            "--min-ms", type=float, default=1.0,
+            help="Рост p95 меньше этого считается шумом.")
+
+    def pick_params(self):
+        """Аргументы адресов: самые нагруженные автор, группа и пост."""
+        user = User.objects.annotate(
+            follows=Count("follower")).order_by("-follows", "pk").first()
+        post = (
+            Post.objects.filter(author=user)
+            .annotate(comments_total=Count("comments"))
+            .order_by("-comments_total", "-pk").first()
+            or Post.objects.order_by("-pk").first()
+        )
+        author = User.objects.annotate(
+            total=Count("posts")).order_by("-total", "pk").first()
+        group = Group.objects.order_by("-posts_count", "pk").first()
+        if post is None or group is None:
+            raise CommandError(
+                "Нет данных для замеров: заполните базу командой "
+                "seed_yatube."
+            )
+        return user, {
+            "username": author.username,
+            "slug": group.slug,
+            "post_id": post.pk,
+            "uidb64": urlsafe_base64_encode(force_bytes(user.pk)),
+            "token": default_token_generator.make_token(user),
+        }
+
+    def urls(self, params):
+        for module_name in URL_MODULES:
+            module = import_module(module_name)
+            for pattern in module.urlpatterns:
+                name = f"{module.app_name}:{pattern.name}"
+                if name in SKIPPED_VIEWS:
+                    continue
+                kwargs = {key: params[key]
+                          for key in pattern.pattern.converters}
+                yield name, reverse(name, kwargs=kwargs)
+
+    def measure(self, client, url, options):
+        samples = []
+        for number in range(options["warmup"] + options["repeat"]):
+            if not options["warm_cache"]:
+                cache.clear()
+            with query_timer() as queries, template_timer() as templates:
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - started
+            if number >= options["warmup"]:
+                samples.append((
+                    elapsed * 1000,
+                    queries["count"],
+                    queries["elapsed"] * 1000,
+                    templates["elapsed"] * 1000,
+                ))
+        latency, query_counts, sql, rendering = zip(*samples)
+        return {
+            "url": url,
+            "status": response.status_code,
+            "p50_ms": round(percentile(latency, 50), 3),
+            "p95_ms": round(percentile(latency, 95), 3),
+            "p99_ms": round(percentile(latency, 99), 3),
+            "queries": statistics.median_low(query_counts),
+            "sql_ms": round(statistics.median(sql), 3),
+            "template_ms": round(statistics.median(rendering), 3),
+        }
+
+    def regressions(self, results, baseline, options):
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None or "error" in before:
+                continue
+            if "error" in result:
+                yield f"{name}: {result['error']}"
+                continue
+            growth = result["p95_ms"] - before["p95_ms"]
+            if (growth > options["min_ms"]
+                    and growth > before["p95_ms"] * options["threshold"]):
+                yield (f"{name}: p95 {before['p95_ms']:.1f} → "
+                       f"{result['p95_ms']:.1f} мс")
+            if result["queries"] > before["queries"]:
+                yield (f"{name}: запросов {before['queries']} → "
+                       f"{result['queries']}")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должен быть больше нуля.")
+        if not options["warm_cache"] and not options["force"]:
+            # cache.clear() сбросит страницы, ленты и счётчики сайта.
+            raise CommandError(
+                "Замеры очищают кеш перед каждым запросом; используйте "
+                "--force или --warm-cache."
+            )
+        user, params = self.pick_params()
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for name, url in self.urls(params):
+            try:
+                result = self.measure(client, url, options)
+            except Exception as error:
+                # Упавший адрес не должен останавливать остальные замеры.
+                results[name] = {"url": url, "error": repr(error)}
+                self.stderr.write(f"{name}: {error!r}")
+                continue
+            results[name] = result
+            self.stdout.write(
+                f"{name} [{result['status']}]: "
+                f"p50 {result['p50_ms']:.1f}, p95 {result['p95_ms']:.1f}, "
+                f"p99 {result['p99_ms']:.1f} мс; "
+                f"запросов {result['queries']} "
+                f"({result['sql_ms']:.1f} мс), "
+                f"шаблоны {result['template_ms']:.1f} мс"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({
+                    "repeat": options["repeat"],
+                    "warm_cache": options["warm_cache"],
+                    "views": results,
+                }, output, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                baseline = json.load(baseline)["views"]
+            regressions = list(self.regressions(results, baseline, options))
+            if regressions:
+                raise CommandError(
+                    "Регрессии:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Регрессий нет."))
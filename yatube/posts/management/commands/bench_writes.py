@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+
+from posts.management.commands.bench_views import percentile
+from posts.models import Comment, Post, User
+
+MARKER = "bench_writes"
+# Поведение SQLite без настроек: журнал отката и соединение на запрос.
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE"}
+
+
+class Phase:
+    """Итоги одного прогона: операции, задержки записи и ошибки."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = []
+        self.reads = 0
+        self.errors = Counter()
+
+    def record(self, kind, elapsed=None, error=None):
+        with self.lock:
+            if error is not None:
+                self.errors[str(error)] += 1
+            elif kind == "write":
+                self.writes.append(elapsed)
+            else:
+                self.reads += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает скорость записи постов и комментариев при "
+        "одновременном чтении лент: с SQLite по умолчанию и с "
+        "SQLITE_PRAGMAS и CONN_MAX_AGE из настроек. Созданные записи "
+        "удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def write(self, rnd):
+        """Новый пост или комментарий, как post_create и add_comment."""
+        if rnd.random() < 0.5:
+            Post.objects.create(
+                text=MARKER, author_id=rnd.choice(self.author_ids))
+        else:
+            Comment.objects.create(
+                text=MARKER, post_id=rnd.choice(self.post_ids),
+                author_id=rnd.choice(self.author_ids))
+
+    def read(self, rnd):
+        """Страница ленты и комментарии поста, как index и post_detail."""
+        list(Post.objects.for_feed()[:settings.COUNT_POST_IN_LIST])
+        list(Comment.objects.filter(
+            post_id=rnd.choice(self.post_ids)).select_related("author"))
+
+    def worker(self, kind, rnd, deadline, phase):
+        operation = self.write if kind == "write" else self.read
+        try:
+            while time.monotonic() < deadline:
+                # Соединения закрываются и открываются так же, как
+                # в начале и конце каждого запроса.
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    operation(rnd)
+                except Exception as error:
+                    phase.record(kind, error=error)
+                else:
+                    phase.record(kind, time.perf_counter() - started)
+                finally:
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    def run_phase(self, pragmas, conn_max_age, options):
+        connections.close_all()
+        database = connections.databases["default"]
+        database["PRAGMAS"] = pragmas
+        database["CONN_MAX_AGE"] = conn_max_age
+        connection.ensure_connection()
+        connection.close()
+        phase = Phase()
+        deadline = time.monotonic() + options["seconds"]
+        kinds = (["write"] * options["writers"]
+                 + ["read"] * options["readers"])
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                kind, random.Random(options["seed"] + number), deadline,
+                phase,
+            ))
+            for number, kind in enumerate(kinds)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return phase
+
+    def report(self, title, phase, seconds):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        writes = [elapsed * 1000 for elapsed in phase.writes]
+        self.stdout.write(
+            f"  записей: {len(writes) / seconds:.0f} в секунду, "
+            f"чтений: {phase.reads / seconds:.0f} в секунду"
+        )
+        if writes:
+            self.stdout.write(
+                f"  запись: p50 {percentile(writes, 50):.1f}, "
+                f"p95 {percentile(writes, 95):.1f}, "
+                f"p99 {percentile(writes, 99):.1f} мс"
+            )
+        for error, count in phase.errors.most_common():
+            self.stdout.write(f"  ошибок «{error}»: {count}")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Команда рассчитана на SQLite.")
+        self.author_ids = list(
+            User.objects.values_list("pk", flat=True)[:1000])
+        self.post_ids = list(Post.objects.order_by("-pk").values_list(
+            "pk", flat=True)[:1000])
+        if not self.post_ids:
+            raise CommandError(
+                "Нет постов: заполните базу командой seed_yatube.")
+        database = connections.databases["default"]
+        conn_max_age = database["CONN_MAX_AGE"]
+        try:
+            before = self.run_phase(DEFAULT_PRAGMAS, 0, options)
+            after = self.run_phase(
+                settings.SQLITE_PRAGMAS, conn_max_age, options)
+        finally:
+            connections.close_all()
+            database.pop("PRAGMAS", None)
+            database["CONN_MAX_AGE"] = conn_max_age
+            connection.ensure_connection()
+        self.report("SQLite по умолчанию", before, options["seconds"])
+        self.report("SQLITE_PRAGMAS и CONN_MAX_AGE", after,
+                    options["seconds"])
+        Post.objects.filter(text=MARKER).delete()
+        Comment.objects.filter(text=MARKER).delete()
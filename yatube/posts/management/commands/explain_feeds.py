@@ -0,0 +1,104 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts.models import Comment, Group, Post, User
+
+FEED_INDEXES = (
+    "post_pub_date_idx",
+    "post_author_pub_date_idx",
+    "post_group_pub_date_idx",
+    "comment_post_created_idx",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает EXPLAIN QUERY PLAN и время запросов лент на временно "
+        "созданных данных — с составными индексами и без них. "
+        "Все изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=200000)
+        parser.add_argument("--authors", type=int, default=500)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def seed(self, options):
+        rnd = random.Random(options["seed"])
+        User.objects.bulk_create(
+            User(username=f"explain_{number}")
+            for number in range(options["authors"])
+        )
+        Group.objects.bulk_create(
+            Group(title=f"Группа {number}", slug=f"explain-{number}",
+                  description="")
+            for number in range(options["groups"])
+        )
+        author_ids = list(User.objects.filter(
+            username__startswith="explain_").values_list("pk", flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith="explain-").values_list("pk", flat=True))
+        Post.objects.bulk_create(
+            (Post(text="explain", author_id=rnd.choice(author_ids),
+                  group_id=rnd.choice(group_ids))
+             for _ in range(options["posts"]))
+        )
+        post = Post.objects.order_by("-pk").first()
+        Comment.objects.bulk_create(
+            (Comment(post=post, author_id=rnd.choice(author_ids),
+                     text="explain")
+             for _ in range(options["comments"]))
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return author_ids[0], group_ids[0], post.pk
+
+    def queries(self, author_id, group_id, post_id):
+        ordering = ("-pub_date", "-id")
+        return (
+            ("index", Post.objects.order_by(*ordering)[:10]),
+            ("profile", Post.objects.filter(
+                author_id=author_id).order_by(*ordering)[:10]),
+            ("group_posts", Post.objects.filter(
+                group_id=group_id).order_by(*ordering)[:10]),
+            ("post_detail comments", Comment.objects.filter(
+                post_id=post_id).order_by("created")[:10]),
+        )
+
+    def report(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        with connection.cursor() as cursor:
+            for name, queryset in queries:
+                sql, params = queryset.query.sql_with_params()
+                # Комментарий делает текст запроса уникальным: модуль
+                # sqlite3 кеширует подготовленные EXPLAIN и не замечает
+                # удаления индексов.
+                cursor.execute(
+                    f"EXPLAIN QUERY PLAN {sql} /* {title} */", params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                elapsed = (time.perf_counter() - started) / repeat * 1000
+                self.stdout.write(f"  {name}: {elapsed:.2f} мс")
+                for line in plan:
+                    self.stdout.write(f"    {line}")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Команда рассчитана на SQLite.")
+        with transaction.atomic():
+            queries = self.queries(*self.seed(options))
+            self.report("С индексами", queries, options["repeat"])
+            with connection.cursor() as cursor:
+                for index in FEED_INDEXES:
+                    cursor.execute(f'DROP INDEX "{index}"')
+            self.report("Без индексов", queries, options["repeat"])
+            transaction.set_rollback(True)
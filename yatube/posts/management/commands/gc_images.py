@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.cache import bump_page_version
+from posts.models import Post
+from posts.storage import post_image_storage
+
+IMAGE_FIELDS = ("image", "image_original")
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет файлы картинок постов, на которые не ссылается ни один "
+        "пост, вместе с их миниатюрами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rehash", action="store_true",
+            help="Сначала переименовать старые файлы по хешу содержимого.",
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=60 * 60,
+            help="Не трогать файлы моложе стольких секунд.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Удалять, даже если ни один пост не ссылается на файлы.",
+        )
+
+    def references(self):
+        """Число постов, ссылающихся на каждый файл."""
+        references = {}
+        for field in IMAGE_FIELDS:
+            rows = Post.objects.exclude(**{field: ""}).order_by().values_list(
+                field).annotate(refs=Count("pk"))
+            for name, refs in rows:
+                references[name] = references.get(name, 0) + refs
+        return references
+
+    def is_referenced(self, name):
+        """Ссылается ли сейчас на файл хотя бы один пост."""
+        query = Q()
+        for field in IMAGE_FIELDS:
+            query |= Q(**{field: name})
+        return Post.objects.filter(query).exists()
+
+    def rehash(self):
+        storage = post_image_storage
+        renamed = 0
+        for name in self.references():
+            if storage.is_hashed(name) or not storage.exists(name):
+                continue
+            with storage.open(name) as file_:
+                hashed = storage.save(name, file_)
+            for field in IMAGE_FIELDS:
+                Post.objects.filter(**{field: name}).update(
+                    **{field: hashed}, updated_at=timezone.now())
+            renamed += 1
+        if renamed:
+            bump_page_version()
+        return renamed
+
+    def handle(self, *args, **options):
+        storage = post_image_storage
+        if options["rehash"] and not options["dry_run"]:
+            self.stdout.write(f"Переименовано файлов: {self.rehash()}")
+        references = self.references()
+        if not references and not options["force"]:
+            # Скорее всего, команда запущена не с той базой данных.
+            raise CommandError(
+                "Ни один пост не ссылается на картинки; используйте --force."
+            )
+        upload_dirs = {
+            Post._meta.get_field(field).upload_to.rstrip("/")
+            for field in IMAGE_FIELDS
+        }
+        threshold = timezone.now() - timedelta(seconds=options["min_age"])
+        seen = removed = 0
+        for name in {
+            name for path in upload_dirs for name in storage.walk(path)
+        }:
+            seen += 1
+            if name in references:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+            if not options["dry_run"]:
+                # Пока шёл обход, файл могли загрузить повторно.
+                if (self.is_referenced(name)
+                        or storage.get_modified_time(name) > threshold):
+                    continue
+                default.kvstore.delete(ImageFile(name, storage))
+                storage.delete(name)
+            removed += 1
+        self.stdout.write(
+            f"Файлов: {seen}, используется: {len(references)}, "
+            f"удалено: {removed}"
+        )
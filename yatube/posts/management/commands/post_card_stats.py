@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import get_card_metrics, reset_card_metrics
+
+
+class Command(BaseCommand):
+    help = "Показывает долю попаданий в кеш карточек постов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        metrics = get_card_metrics()
+        total = metrics["hits"] + metrics["misses"]
+        rate = metrics["hits"] / total * 100 if total else 0
+        self.stdout.write(
+            f"Попаданий: {metrics['hits']}, промахов: {metrics['misses']}, "
+            f"доля попаданий: {rate:.1f}%"
+        )
+        if options["reset"]:
+            reset_card_metrics()
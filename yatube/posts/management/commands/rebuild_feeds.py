@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import FEED_BATCH_SIZE, celebrity_ids, fan_out_authors
+from posts.models import FeedItem, Follow
+from posts.utils import chunked
+
+
+class Command(BaseCommand):
+    help = "Пересобирает материализованные ленты подписок."
+
+    def handle(self, *args, **options):
+        FeedItem.objects.all().delete()
+        # Ленты раздаются пачками авторов: на пачку один INSERT … SELECT
+        # в своей транзакции, строки лент в Python не читаются.
+        authors = Follow.objects.filter(
+            user__isnull=False, author__isnull=False
+        ).order_by("author_id").values_list(
+            "author_id", flat=True).distinct()
+        for batch in chunked(authors.iterator(), FEED_BATCH_SIZE):
+            celebrities = set(celebrity_ids(batch))
+            batch = [author_id for author_id in batch
+                     if author_id not in celebrities]
+            if batch:
+                fan_out_authors(batch)
+        self.stdout.write(
+            f"Записей в лентах: {FeedItem.objects.count()}"
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, SearchTerm
+from posts.search import index_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает поисковый индекс по текстам постов. Индекс пишется "
+        "пачками, и до конца пересборки поиск находит не все посты."
+    )
+
+    def handle(self, *args, **options):
+        SearchTerm.objects.all().delete()
+        index_posts(Post.objects.all())
+        self.stdout.write(
+            f"Записей в поисковом индексе: {SearchTerm.objects.count()}"
+        )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Group, Post, User, UserStats
+
+
+def count_posts(field, outer_field="pk", model=Post):
+    """Подзапрос с количеством записей `model` (по умолчанию постов)
+    по полю `field`."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer_field)})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики постов и комментариев."
+
+    def reconcile(self, queryset, actual, counter="posts_count"):
+        drifted = queryset.annotate(actual=actual).exclude(
+            **{counter: F("actual")})
+        return queryset.filter(
+            pk__in=list(drifted.values_list("pk", flat=True))
+        ).update(**{counter: actual})
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=user_id) for user_id in User.objects.filter(
+                posts__isnull=False, stats__isnull=True,
+            ).values_list("pk", flat=True).distinct()),
+            ignore_conflicts=True,
+        )
+        fixed_groups = self.reconcile(
+            Group.objects.all(), count_posts("group")
+        )
+        fixed_authors = self.reconcile(
+            UserStats.objects.all(), count_posts("author", "user")
+        )
+        fixed_posts = self.reconcile(
+            Post.objects.all(), count_posts("post", model=Comment),
+            counter="comments_count",
+        )
+        self.stdout.write(
+            f"Исправлено счётчиков: групп — {fixed_groups}, "
+            f"авторов — {fixed_authors}, постов — {fixed_posts}"
+        )
@@ -0,0 +1,307 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts.cache import bump_page_version
+from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import post_image_storage
+from posts.utils import chunked
+
+WORDS = (
+    "кот", "собака", "город", "утро", "вечер", "дорога", "море", "лес",
+    "книга", "музыка", "кофе", "работа", "отпуск", "поезд", "река",
+    "солнце", "дождь", "снег", "друг", "семья", "проект", "код", "идея",
+    "новость", "фото", "прогулка", "парк", "гора", "ветер", "окно",
+    "сегодня", "вчера", "завтра", "снова", "очень", "тихо", "быстро",
+    "наконец", "почему", "просто", "красивый", "новый", "старый",
+    "тёплый", "холодный", "большой", "маленький", "первый", "последний",
+    "думаю", "вижу", "пишу", "читаю", "слушаю", "жду", "люблю", "помню",
+    "еду", "гуляю", "смотрю", "готовлю", "учу", "играю", "строю",
+)
+POST_WORDS = (5, 80)
+COMMENT_WORDS = (2, 25)
+GROUP_SHARE = 0.6
+# Показатели степенных распределений: популярность авторов у читателей,
+# активность авторов и групп, число подписок у пользователя.
+FOLLOW_EXPONENT = 1.1
+ACTIVITY_EXPONENT = 1.0
+FOLLOWS_ALPHA = 1.5
+TEXT_POOL = 10000
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа для `count` рангов."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу тестовыми данными: пользователями, группами, "
+        "постами, комментариями и степенным графом подписок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=100000)
+        parser.add_argument(
+            "--follows", type=int, default=20,
+            help="Среднее число подписок у пользователя.")
+        parser.add_argument(
+            "--images", type=int, default=0,
+            help="Сколько разных картинок сгенерировать для постов.")
+        parser.add_argument("--image-share", type=float, default=0.2)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--skip-derived", action="store_true",
+            help="Не пересчитывать счётчики, ленты и поисковый индекс.")
+
+    def load(self, label, rows, write):
+        """Записывает поток пачками, по транзакции на пачку."""
+        started = time.perf_counter()
+        count = 0
+        for chunk in chunked(rows, self.batch_size):
+            with transaction.atomic():
+                write(chunk)
+            count += len(chunk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label}: {count} за {elapsed:.1f} с "
+            f"({count / max(elapsed, 1e-6):.0f} в секунду)"
+        )
+
+    def insert(self, label, model, objects):
+        self.load(label, objects, lambda chunk: model.objects.bulk_create(
+            chunk, ignore_conflicts=True))
+
+    def insert_rows(self, label, model, fields, rows):
+        """Вставляет готовые строки значений полей `fields`.
+
+        На миллионах записей bulk_create большую часть времени готовит
+        значения каждого поля каждого объекта, поэтому посты
+        и комментарии пишутся через executemany. Остальные поля модели
+        получают значения по умолчанию.
+        """
+        opts = model._meta
+        rest = [field for field in opts.concrete_fields
+                if field.attname not in fields and not field.primary_key]
+        tail = tuple(field.get_db_prep_save(field.get_default(), connection)
+                     for field in rest)
+        columns = [opts.get_field(name).column for name in fields]
+        columns += [field.column for field in rest]
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(opts.db_table),
+            ", ".join(quote(column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+
+        def write(chunk):
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [row + tail for row in chunk])
+
+        self.load(label, rows, write)
+
+    def new_ids(self, model, last_id, count):
+        """Первичные ключи только что вставленных записей."""
+        top = model.objects.aggregate(top=Max("pk"))["top"] or 0
+        if top - last_id == count:
+            return range(last_id + 1, top + 1)
+        return list(model.objects.filter(
+            pk__gt=last_id).order_by("pk").values_list("pk", flat=True))
+
+    def last_id(self, model):
+        return model.objects.aggregate(top=Max("pk"))["top"] or 0
+
+    def text(self, words):
+        words = self.rnd.choices(WORDS, k=self.rnd.randint(*words))
+        return " ".join(words).capitalize() + "."
+
+    def texts(self, words):
+        """Запас текстов: собирать текст для каждой записи слишком долго."""
+        return [self.text(words) for _ in range(TEXT_POOL)]
+
+    def seed_users(self, count):
+        last_id = self.last_id(User)
+        self.insert("Пользователи", User, (
+            User(username=f"seed_{last_id + number}",
+                 password=UNUSABLE_PASSWORD_PREFIX)
+            for number in range(1, count + 1)
+        ))
+        return self.new_ids(User, last_id, count)
+
+    def seed_groups(self, count):
+        last_id = self.last_id(Group)
+        self.insert("Группы", Group, (
+            Group(title=f"Группа {last_id + number}",
+                  slug=f"seed-{last_id + number}",
+                  description=self.text(COMMENT_WORDS))
+            for number in range(1, count + 1)
+        ))
+        return self.new_ids(Group, last_id, count)
+
+    def seed_images(self, count):
+        """Сохраняет `count` разных картинок, их делят между собой посты."""
+        images = []
+        extension = settings.IMAGE_FORMAT.lower()
+        for _ in range(count):
+            size = (self.rnd.randint(320, 1280), self.rnd.randint(240, 960))
+            color = tuple(self.rnd.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new("RGB", size, color).save(buffer, settings.IMAGE_FORMAT)
+            name = post_image_storage.save(
+                f"posts/seed.{extension}", ContentFile(buffer.getvalue()))
+            images.append((name, *size))
+        return images
+
+    def post_date(self, index):
+        """Дата поста растёт вместе с ключом, как у настоящей ленты."""
+        return self.start + self.span * (index + 0.5) / self.total_posts
+
+    def seed_posts(self, count, author_ids, group_ids, images, image_share):
+        authors = list(author_ids)
+        self.rnd.shuffle(authors)
+        author_weights = zipf_weights(len(authors), ACTIVITY_EXPONENT)
+        groups = list(group_ids)
+        group_weights = zipf_weights(len(groups), ACTIVITY_EXPONENT)
+
+        texts = self.texts(POST_WORDS)
+        adapt = connection.ops.adapt_datetimefield_value
+        no_image = ("", None, None)
+
+        def posts():
+            for index in range(count):
+                pub_date = adapt(self.post_date(index))
+                group_id = None
+                if groups and self.rnd.random() < GROUP_SHARE:
+                    group_id = self.rnd.choices(
+                        groups, cum_weights=group_weights)[0]
+                image = no_image
+                if images and self.rnd.random() < image_share:
+                    image = self.rnd.choice(images)
+                yield (
+                    self.rnd.choice(texts),
+                    self.rnd.choices(authors, cum_weights=author_weights)[0],
+                    group_id,
+                    pub_date,
+                    pub_date,
+                    *image,
+                )
+
+        last_id = self.last_id(Post)
+        self.insert_rows("Посты", Post, (
+            "text", "author_id", "group_id", "pub_date", "updated_at",
+            "image", "image_width", "image_height",
+        ), posts())
+        return self.new_ids(Post, last_id, count)
+
+    def seed_comments(self, count, post_ids, user_ids):
+        users = list(user_ids)
+        self.rnd.shuffle(users)
+        user_weights = zipf_weights(len(users), ACTIVITY_EXPONENT)
+        texts = self.texts(COMMENT_WORDS)
+        adapt = connection.ops.adapt_datetimefield_value
+        now = timezone.now()
+
+        def comments():
+            for _ in range(count):
+                index = self.rnd.randrange(len(post_ids))
+                created = adapt(min(
+                    now,
+                    self.post_date(index) + timedelta(
+                        minutes=self.rnd.expovariate(1 / 90)),
+                ))
+                yield (
+                    post_ids[index],
+                    self.rnd.choices(users, cum_weights=user_weights)[0],
+                    self.rnd.choice(texts),
+                    created,
+                    created,
+                )
+
+        self.insert_rows("Комментарии", Comment, (
+            "post_id", "author_id", "text", "created", "updated_at",
+        ), comments())
+
+    def seed_follows(self, average, user_ids):
+        """Подписки: у читателей и авторов популярность по степенному закону.
+
+        Число подписок пользователя — распределение Парето со средним
+        `average`, а выбор автора — закон Ципфа, поэтому у немногих
+        авторов оказываются тысячи подписчиков, а у большинства — единицы.
+        """
+        authors = list(user_ids)
+        self.rnd.shuffle(authors)
+        author_weights = zipf_weights(len(authors), FOLLOW_EXPONENT)
+        scale = average * (FOLLOWS_ALPHA - 1) / FOLLOWS_ALPHA
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(
+                    len(authors) - 1,
+                    int(self.rnd.paretovariate(FOLLOWS_ALPHA) * scale),
+                )
+                chosen = set(self.rnd.choices(
+                    authors, cum_weights=author_weights, k=wanted))
+                chosen.discard(user_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.insert("Подписки", Follow, follows())
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.total_posts = max(options["posts"], 1)
+        self.span = timedelta(days=options["days"])
+        self.start = timezone.now() - self.span
+        sqlite = connection.vendor == "sqlite"
+        # Данные можно пересоздать, поэтому на время заполнения не ждём
+        # сброса каждой транзакции на диск. Внутри транзакции SQLite
+        # менять это не даёт.
+        relaxed = sqlite and not connection.in_atomic_block
+        if relaxed:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous")
+                synchronous = cursor.fetchone()[0]
+                cursor.execute("PRAGMA synchronous = OFF")
+
+        user_ids = self.seed_users(options["users"])
+        group_ids = self.seed_groups(options["groups"])
+        images = self.seed_images(options["images"])
+        if user_ids:
+            post_ids = self.seed_posts(
+                options["posts"], user_ids, group_ids, images,
+                options["image_share"],
+            )
+            if post_ids:
+                self.seed_comments(options["comments"], post_ids, user_ids)
+            self.seed_follows(options["follows"], user_ids)
+        if not options["skip_derived"]:
+            # bulk_create не отправляет сигналы: производные данные
+            # пересчитываются целиком, пачками по транзакции на пачку.
+            for command in ("reconcile_counters", "rebuild_feeds",
+                            "rebuild_search_index"):
+                call_command(command, stdout=self.stdout)
+        if sqlite:
+            with connection.cursor() as cursor:
+                if relaxed:
+                    cursor.execute(f"PRAGMA synchronous = {synchronous}")
+                cursor.execute("ANALYZE")
+        bump_page_version()
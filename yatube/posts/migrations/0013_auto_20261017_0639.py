@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:39
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20261017_0638'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentHashStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image_original',
+            field=models.FileField(blank=True, editable=False, storage=posts.storage.ContentHashStorage(), upload_to='posts/originals/', verbose_name='Исходная картинка'),
+        ),
+    ]
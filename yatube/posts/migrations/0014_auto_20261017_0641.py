@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:41
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия правил posts.search на момент миграции: от кода приложения
+# миграция не зависит.
+TOKEN = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in TOKEN.findall(text.lower().replace('ё', 'е'))
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def fill_search_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    db = schema_editor.connection.alias
+    posts = Post.objects.using(db).order_by('pk').values_list('pk', 'text')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        SearchTerm.objects.using(db).bulk_create(
+            (SearchTerm(term=term, post_id=post_id, weight=weight)
+             for post_id, text in batch
+             for term, weight in Counter(tokenize(text)).items()),
+            batch_size=BATCH_SIZE,
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_auto_20261017_0639'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('weight', models.PositiveIntegerField(verbose_name='Число вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
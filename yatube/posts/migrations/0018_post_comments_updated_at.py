@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:43
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def fill_comments_updated_at(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Post.objects.update(comments_updated_at=Subquery(
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(updated_at=Max('updated_at'))
+        .values('updated_at')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_item_user_pub_date_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_updated_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Дата изменения комментариев'),
+        ),
+        migrations.RunPython(
+            fill_comments_updated_at, migrations.RunPython.noop),
+    ]
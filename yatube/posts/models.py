@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -9,17 +11,38 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        "Количество постов",
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек лент: только поля из includes/post.html."""
+        return self.select_related("author", "group").only(
+            "text",
+            "pub_date",
+            "image",
+            "author__username",
+            "author__first_name",
+            "author__last_name",
+            "group__slug",
+            "comments_count",
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name="Текст",
         help_text="Текст поста",
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,19 +60,84 @@ class Post(models.Model):
     image = models.ImageField(
         "Картинка",
         upload_to="posts/",
+        storage=post_image_storage,
         blank=True,
     )
+    # Размеры заполняются при загрузке: ImageField с width_field
+    # открывал бы файл при создании каждого экземпляра без размеров.
+    image_width = models.PositiveIntegerField(
+        "Ширина картинки", null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        "Высота картинки", null=True, blank=True, editable=False)
+    image_original = models.FileField(
+        "Исходная картинка",
+        upload_to="posts/originals/",
+        storage=post_image_storage,
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        "Количество комментариев",
+        default=0,
+        editable=False,
+    )
+    # Обновляется вместе со счётчиком: для ETag и Last-Modified
+    # страницы поста не нужен MAX по всем комментариям.
+    comments_updated_at = models.DateTimeField(
+        "Дата изменения комментариев",
+        null=True,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"],
+                name="post_pub_date_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчики постов обновляются сигналами в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("posts:post_detail", args=[self.id])
 
 
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField(
+        "Количество постов",
+        default=0,
+    )
+
+    def __str__(self):
+        return str(self.user)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -74,6 +162,24 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name='Дата комментария',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created"],
+                name="comment_post_created_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев поста обновляется сигналом в той же
+        # транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Follow(models.Model):
@@ -101,3 +207,60 @@ class Follow(models.Model):
                 name='unique_follow',
             )
         ]
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Читатель",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Пост",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации поста")
+
+    class Meta:
+        ordering = ("-pub_date",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"],
+                name="unique_feed_item",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="feed_item_user_pub_date_idx",
+            )
+        ]
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса для поиска по текстам постов."""
+
+    term = models.CharField("Слово", max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="search_terms",
+        verbose_name="Пост",
+    )
+    weight = models.PositiveIntegerField("Число вхождений")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "post"],
+                name="unique_search_term",
+            )
+        ]
+
+    def __str__(self):
+        return self.term
@@ -0,0 +1,111 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору: без номера и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return "<Page by cursor>"
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу сортировки.
+
+    Первая страница и страницы по курсорам `?after=`/`?before=`
+    выбираются условием на ключ без OFFSET и без подсчёта общего
+    числа записей. Номерные страницы (`?page=`) работают как в обычном
+    Paginator.
+    """
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id"),
+                 **kwargs):
+        self.ordering = ordering
+        self.keys = tuple(field.lstrip("-") for field in ordering)
+        self.descending = ordering[0].startswith("-")
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, key)) for key in self.keys]
+        raw = json.dumps(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw.decode())
+        except (ValueError, UnicodeDecodeError):
+            raise InvalidPage("Некорректный курсор")
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidPage("Некорректный курсор")
+        return values
+
+    def next_cursor(self, page):
+        if page.has_next() and len(page):
+            return self.encode_cursor(page[-1])
+        return ""
+
+    def previous_cursor(self, page):
+        if page.has_previous() and len(page):
+            return self.encode_cursor(page[0])
+        return ""
+
+    def _beyond(self, values, forward):
+        """Условие «строго после курсора» в заданном направлении."""
+        lookup = "lt" if forward == self.descending else "gt"
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            step = Q(**{f"{key}__{lookup}": values[index]})
+            for prev_key, prev_value in zip(self.keys, values[:index]):
+                step &= Q(**{prev_key: prev_value})
+            condition |= step
+        return condition
+
+    def first_page(self):
+        """Первая страница без COUNT(*).
+
+        Это обычная страница номер 1. Выбирается на одну запись больше
+        страницы: если лишней записи нет, `count` точный, а если есть,
+        `count` известен только снизу — этого хватает для `has_next`,
+        а номерных ссылок на последнюю страницу шаблоны не строят.
+        """
+        object_list = list(self.object_list[:self.per_page + 1])
+        self.count = len(object_list)
+        return Page(object_list[:self.per_page], 1, self)
+
+    def cursor_page(self, after=None, before=None):
+        """Страница после курсора `after` или перед курсором `before`."""
+        forward = before is None
+        values = self.decode_cursor(after if forward else before)
+        object_list = self.object_list.filter(self._beyond(values, forward))
+        if not forward:
+            object_list = object_list.reverse()
+        object_list = list(object_list[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if forward:
+            return CursorPage(object_list, self, has_more, True)
+        object_list.reverse()
+        return CursorPage(object_list, self, True, has_more)
+
+    def get_cursor_page(self, after=None, before=None):
+        """Как `cursor_page`, но при битом курсоре отдаёт первую страницу."""
+        try:
+            return self.cursor_page(after=after, before=before)
+        except (InvalidPage, ValidationError, ValueError):
+            return self.first_page()
@@ -0,0 +1,102 @@
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+
+from .models import Post, SearchTerm
+
+TOKEN = re.compile(r"\w+")
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+TOTAL_KEY = "search:posts_total"
+TOTAL_TIMEOUT = 60 * 10
+# Сколько постов индексируется за проход и записей за один INSERT.
+SEARCH_BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, «ё» заменена на «е»."""
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in TOKEN.findall(text.lower().replace("ё", "е"))
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def search_terms(post_id, text):
+    """Записи индекса для текста поста."""
+    return [
+        SearchTerm(term=term, post_id=post_id, weight=weight)
+        for term, weight in Counter(tokenize(text)).items()
+    ]
+
+
+def index_post(post):
+    """Перестраивает записи индекса для одного поста."""
+    SearchTerm.objects.filter(post_id=post.pk).delete()
+    SearchTerm.objects.bulk_create(
+        search_terms(post.pk, post.text), batch_size=SEARCH_BATCH_SIZE)
+
+
+def index_posts(posts):
+    """Индексирует посты пачками по SEARCH_BATCH_SIZE по возрастанию pk.
+
+    Записи пачки пишутся одним executemany в своей транзакции: объекты
+    модели для миллионов слов не создаются.
+    """
+    opts = SearchTerm._meta
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES (%s, %s, %s)".format(
+        quote(opts.db_table),
+        ", ".join(quote(opts.get_field(name).column)
+                  for name in ("term", "post", "weight")),
+    )
+    posts = posts.order_by("pk").values_list("pk", "text")
+    last_pk = None
+    while True:
+        batch = posts if last_pk is None else posts.filter(pk__gt=last_pk)
+        batch = list(batch[:SEARCH_BATCH_SIZE])
+        if not batch:
+            return
+        rows = [
+            (term, post_id, weight)
+            for post_id, text in batch
+            for term, weight in Counter(tokenize(text)).items()
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        last_pk = batch[-1][0]
+
+
+def search_posts(query, queryset=None):
+    """Посты, содержащие все слова запроса, с релевантностью `rank`.
+
+    Релевантность — сумма TF-IDF слов запроса, умноженная на 1000 и
+    округлённая, чтобы по ней можно было листать курсором.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    terms = sorted(set(tokenize(query)))[:MAX_QUERY_TERMS]
+    frequencies = dict(
+        SearchTerm.objects.filter(term__in=terms).values_list(
+            "term").annotate(Count("id"))
+    )
+    if not terms or len(frequencies) < len(terms):
+        return queryset.annotate(rank=Value(0, IntegerField())).none()
+    total = cache.get_or_set(TOTAL_KEY, Post.objects.count, TOTAL_TIMEOUT)
+    weights = [
+        When(
+            search_terms__term=term,
+            then=F("search_terms__weight") * round(
+                1000 * math.log(1 + total / frequency)),
+        )
+        for term, frequency in frequencies.items()
+    ]
+    return queryset.filter(search_terms__term__in=terms).annotate(
+        matched=Count("search_terms"),
+        rank=Sum(Case(*weights, output_field=IntegerField())),
+    ).filter(matched=len(terms))
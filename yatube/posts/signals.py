@@ -0,0 +1,146 @@
+from contextvars import ContextVar
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.thumbnails import thumbnail_ready
+
+from .cache import bump_page_version
+from .counters import (change_author_posts, change_group_posts,
+                       change_post_comments)
+from .feeds import (backfill_author, backfill_feed, fan_out_post,
+                    is_celebrity, prune_feed)
+from .follows import invalidate_follows
+from .models import Comment, Follow, Group, Post
+from .search import index_post
+
+# Посты, которые удаляются сейчас. Их комментарии удаляются каскадом, и
+# обновлять счётчик поста и сбрасывать кеш для каждого не нужно.
+# pre_delete для всех удаляемых объектов отправляется до удаления
+# первого из них, поэтому комментарий запоминает отметку заранее: его
+# post_delete может прийти и после post_delete поста.
+deleting_posts = ContextVar("deleting_posts", default=frozenset())
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_group(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list("group_id", flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        change_author_posts(instance.author_id, 1)
+        change_group_posts(instance.group_id, 1)
+        return
+    previous_group_id = getattr(instance, "_previous_group_id", None)
+    if previous_group_id != instance.group_id:
+        change_group_posts(previous_group_id, -1)
+        change_group_posts(instance.group_id, 1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_remember_deleting(sender, instance, **kwargs):
+    deleting_posts.set(deleting_posts.get() | {instance.pk})
+
+
+@receiver(post_delete, sender=Post)
+def post_forget_deleting(sender, instance, **kwargs):
+    deleting_posts.set(deleting_posts.get() - {instance.pk})
+
+
+@receiver(post_delete, sender=Post)
+def post_count_on_delete(sender, instance, **kwargs):
+    change_author_posts(instance.author_id, -1)
+    change_group_posts(instance.group_id, -1)
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_remember_post_deleting(sender, instance, **kwargs):
+    instance._post_deleting = instance.post_id in deleting_posts.get()
+
+
+@receiver(post_save, sender=Comment)
+def comment_count_on_save(sender, instance, created, **kwargs):
+    change_post_comments(instance.post_id, 1 if created else 0)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_count_on_delete(sender, instance, **kwargs):
+    if not getattr(instance, "_post_deleting", False):
+        change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_index_text(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or "text" in update_fields:
+        index_post(instance)
+
+
+# Граф подписок сбрасывается раньше остальных обработчиков: они
+# проверяют число подписчиков автора.
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_invalidate_graph(sender, instance, **kwargs):
+    invalidate_follows(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        backfill_feed(instance.user_id, instance.author_id)
+
+
+@receiver(pre_delete, sender=Follow)
+def follow_remember_celebrity(sender, instance, **kwargs):
+    instance._author_was_celebrity = is_celebrity(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_prune(sender, instance, **kwargs):
+    prune_feed(instance.user_id, instance.author_id)
+    if (getattr(instance, "_author_was_celebrity", False)
+            and not is_celebrity(instance.author_id)):
+        # Посты, написанные, пока автор был знаменитостью, не
+        # раздавались: раздаём их оставшимся подписчикам.
+        backfill_author(instance.author_id)
+
+
+@receiver(thumbnail_ready)
+def thumbnail_refresh_posts(sender, file_, **kwargs):
+    # Страницы и ETag постов с исходником вместо миниатюры устарели.
+    Post.objects.filter(image=file_.name).update(updated_at=timezone.now())
+    bump_page_version()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_pages(sender, **kwargs):
+    bump_page_version()
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_pages_without_comment(sender, instance, **kwargs):
+    # Удаление поста сбросит кеш один раз за все его комментарии.
+    if not getattr(instance, "_post_deleting", False):
+        bump_page_version()
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_pages_without_post(sender, **kwargs):
+    # Удалённый пост не должен показываться и на устаревших страницах.
+    bump_page_version(discard=True)
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — SHA-256 его содержимого.
+
+    Одинаковые загрузки сохраняются один раз и дают одно имя, а значит
+    и общие миниатюры и записи кеша. Файлы не удаляются вместе с
+    постами: на один файл могут ссылаться многие посты, поэтому
+    неиспользуемые файлы удаляет команда gc_images.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], f"{digest}{extension}")
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.search(name))
+
+    def walk(self, path):
+        """Имена всех файлов каталога `path` и его подкаталогов."""
+        if not self.exists(path):
+            return
+        directories, files = self.listdir(path)
+        for name in files:
+            yield f"{path}/{name}"
+        for directory in directories:
+            yield from self.walk(f"{path}/{directory}")
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения не даёт gc_images удалить файл,
+            # на который вот-вот сошлётся новый пост.
+            os.utime(self.path(name), None)
+            return name
+        # При одновременной записи одинаковых файлов FileSystemStorage
+        # добавит суффикс ко второму; gc_images --rehash их объединит.
+        return super()._save(name, content)
+
+
+post_image_storage = ContentHashStorage()
@@ -0,0 +1,183 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.locks import _lock_path, acquire_lock, is_locked, release_lock
+from .. import cache as page_cache
+from ..cache import (PAGE_LOCK_KEY, PAGE_LOCK_TIMEOUT, PAGE_REPLACED_KEY,
+                     PAGE_VERSION_KEY, bump_page_version, get_page_version,
+                     versioned_cache_page)
+
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "page-stampede",
+    }
+}
+CACHE_DIR = tempfile.mkdtemp()
+FILE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_DIR,
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageStampedeTest(SimpleTestCase):
+    BURST = 20
+    RENDER_SECONDS = 0.2
+
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+        self.renders_lock = threading.Lock()
+        self.factory = RequestFactory()
+
+        @versioned_cache_page(60)
+        def slow_view(request):
+            with self.renders_lock:
+                self.renders += 1
+                number = self.renders
+            time.sleep(self.RENDER_SECONDS)
+            return HttpResponse(f"render {number}")
+
+        self.view = slow_view
+
+    def burst(self):
+        """Одновременно запрашивает страницу BURST раз."""
+        barrier = threading.Barrier(self.BURST)
+        contents = []
+
+        def request_page():
+            barrier.wait()
+            contents.append(self.view(self.factory.get("/")).content)
+
+        threads = [
+            threading.Thread(target=request_page) for _ in range(self.BURST)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return contents
+
+    def test_cold_burst_renders_once(self):
+        """Без страницы в кеше её считает один запрос, остальные ждут."""
+        contents = self.burst()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(set(contents), {b"render 1"})
+
+    def test_stale_page_served_while_one_request_renders(self):
+        """Устаревшую страницу пересчитывает один запрос."""
+        self.view(self.factory.get("/"))
+        bump_page_version()
+        contents = self.burst()
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(contents.count(b"render 2"), 1)
+        self.assertEqual(contents.count(b"render 1"), self.BURST - 1)
+        self.assertEqual(self.view(self.factory.get("/")).content,
+                         b"render 2")
+
+    def request_while_locked(self):
+        """Запрос, пока страницу пересчитывает другой запрос."""
+        lock_key = PAGE_LOCK_KEY.format(hashlib.md5(b"/").hexdigest())
+        lock = acquire_lock(lock_key, PAGE_LOCK_TIMEOUT)
+        try:
+            with mock.patch.object(page_cache, "PAGE_WAIT_TIMEOUT", 0.1):
+                return self.view(self.factory.get("/")).content
+        finally:
+            release_lock(lock_key, lock)
+
+    def test_stale_page_served_only_within_lock_timeout(self):
+        """Устаревшая страница не отдаётся дольше PAGE_LOCK_TIMEOUT."""
+        self.view(self.factory.get("/"))
+        replaced = get_page_version()
+        bump_page_version()
+        self.assertEqual(self.request_while_locked(), b"render 1")
+        cache.set(PAGE_REPLACED_KEY.format(replaced),
+                  time.time() - PAGE_LOCK_TIMEOUT - 1)
+        self.assertEqual(self.request_while_locked(), b"render 2")
+
+    def test_stale_page_not_served_after_discard(self):
+        """После удаления поста устаревшая страница не отдаётся."""
+        self.view(self.factory.get("/"))
+        bump_page_version(discard=True)
+        self.assertEqual(self.request_while_locked(), b"render 2")
+
+    def test_page_version_never_repeats(self):
+        """Новая версия кеша страниц не совпадает ни с одной прежней,
+        даже если ключ версии вытеснен из кеша."""
+        seen = {get_page_version()}
+        for _ in range(5):
+            bump_page_version()
+            self.assertNotIn(get_page_version(), seen)
+            seen.add(get_page_version())
+        cache.delete(PAGE_VERSION_KEY)
+        self.assertNotIn(get_page_version(), seen)
+
+
+@override_settings(CACHES=FILE_CACHES)
+class FilePageStampedeTest(PageStampedeTest):
+    """Те же проверки с кешем в файлах, как в настройках проекта."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+
+def hold_lock(key, acquired, done):
+    """Держит блокировку в другом процессе и завершается, не сняв её."""
+    acquired.send(acquire_lock(key, PAGE_LOCK_TIMEOUT) is not None)
+    done.recv()
+
+
+@override_settings(CACHES=FILE_CACHES)
+class FileLockTest(SimpleTestCase):
+    KEY = "posts:page_lock:test"
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_lock_exclusive_and_released(self):
+        """Блокировку держит один владелец, снятая удаляет свой файл."""
+        lock = acquire_lock(self.KEY, PAGE_LOCK_TIMEOUT)
+        self.assertIsNotNone(lock)
+        self.assertIsNone(acquire_lock(self.KEY, PAGE_LOCK_TIMEOUT))
+        self.assertTrue(is_locked(self.KEY))
+        release_lock(self.KEY, lock)
+        self.assertFalse(is_locked(self.KEY))
+        self.assertFalse(os.path.exists(_lock_path(self.KEY)))
+        release_lock(self.KEY, acquire_lock(self.KEY, PAGE_LOCK_TIMEOUT))
+
+    def test_lock_exclusive_between_processes(self):
+        """Блокировку другого процесса не захватить, пока он жив,
+        а после его падения она свободна."""
+        context = multiprocessing.get_context("fork")
+        acquired, acquired_child = context.Pipe()
+        done_child, done = context.Pipe()
+        process = context.Process(
+            target=hold_lock, args=(self.KEY, acquired_child, done_child))
+        process.start()
+        try:
+            self.assertTrue(acquired.recv())
+            self.assertIsNone(acquire_lock(self.KEY, PAGE_LOCK_TIMEOUT))
+        finally:
+            done.send(True)
+            process.join()
+        self.assertTrue(is_locked(self.KEY))
+        lock = acquire_lock(self.KEY, PAGE_LOCK_TIMEOUT)
+        self.assertIsNotNone(lock)
+        release_lock(self.KEY, lock)
@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..follows import get_followers_counts, get_following_ids
+from ..models import FeedItem, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Author")
+        cls.reader = User.objects.create_user(username="Reader")
+        cls.other_reader = User.objects.create_user(username="OtherReader")
+        cls.post = Post.objects.create(text="Старый пост", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(FollowFeedTest.reader)
+
+    def follow_feed(self):
+        response = self.reader_client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.reader_client.get(
+            reverse("posts:profile_follow", args=[self.author.username]))
+        self.assertEqual(self.follow_feed(), [FollowFeedTest.post])
+        self.reader_client.get(
+            reverse("posts:profile_unfollow", args=[self.author.username]))
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост записывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_feed()[0], post)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты автора с большим числом подписчиков не раздаются."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text="Пост звезды", author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_feed()[0], post)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_below_limit_again_gets_fanned_out(self):
+        """Посты, написанные, пока у автора было слишком много
+        подписчиков, раздаются, когда подписчиков становится меньше."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        post = Post.objects.create(text="Пост звезды", author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        Follow.objects.filter(
+            user=self.other_reader, author=self.author).delete()
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_feed()[0], post)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_rebuild_matches_signals(self):
+        """Пересборка даёт те же ленты, что и сигналы, и не раздаёт
+        посты знаменитостей."""
+        star = User.objects.create_user(username="Star")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=self.other_reader, author=star)
+        Post.objects.create(text="Пост звезды", author=star)
+        Post.objects.create(text="Новый пост", author=self.author)
+
+        def feeds():
+            return sorted(FeedItem.objects.values_list(
+                "user_id", "post_id", "pub_date"))
+
+        expected = feeds()
+        self.assertFalse(FeedItem.objects.filter(post__author=star).exists())
+        call_command("rebuild_feeds", stdout=StringIO())
+        self.assertEqual(feeds(), expected)
+
+    def test_follow_checks_use_cached_graph(self):
+        """С прогретым кешем проверка подписки не обращается к подпискам
+        в базе, а подписка и отписка сбрасывают кеш."""
+        profile_url = reverse("posts:profile", args=[self.author.username])
+        self.reader_client.get(
+            reverse("posts:profile_follow", args=[self.author.username]))
+        self.reader_client.get(reverse("posts:follow_index"))
+        response = self.reader_client.get(profile_url)
+        self.assertContains(response, "Отписаться")
+        self.assertEqual(response.context["followers_count"], 1)
+        for url in (profile_url, reverse("posts:follow_index")):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.reader_client.get(url)
+                self.assertFalse(
+                    [query["sql"] for query in queries
+                     if Follow._meta.db_table in query["sql"]])
+        self.reader_client.get(
+            reverse("posts:profile_unfollow", args=[self.author.username]))
+        self.assertEqual(get_following_ids(self.reader.id), frozenset())
+        self.assertEqual(
+            get_followers_counts([self.author.id]), {self.author.id: 0})
+        self.assertContains(
+            self.reader_client.get(profile_url), "Подписаться")
@@ -1,12 +1,14 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Group, Post
 
@@ -87,6 +89,66 @@ class FormTest(TestCase):
             HTTPStatus.OK,
         )
 
+    @override_settings(IMAGE_MAX_SIZE=(100, 100), IMAGE_FORMAT="WEBP")
+    def test_create_post_image_ingested(self):
+        """Большая картинка уменьшается и перекодируется без EXIF."""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = "Камера"
+        Image.new("RGB", (400, 200), "red").save(buffer, "JPEG", exif=exif)
+        self.form["image"] = SimpleUploadedFile(
+            name="photo.jpg", content=buffer.getvalue(),
+            content_type="image/jpeg",
+        )
+        self.autorized_client.post(reverse("posts:post_create"), self.form)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith(".webp"))
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+
+    def test_truncated_image_rejected(self):
+        """Обрезанная картинка даёт ошибку формы, а не ошибку сервера."""
+        buffer = BytesIO()
+        Image.effect_noise((200, 200), 64).convert("RGB").save(
+            buffer, "JPEG")
+        content = buffer.getvalue()
+        self.form["image"] = SimpleUploadedFile(
+            name="broken.jpg", content=content[:len(content) // 2],
+            content_type="image/jpeg",
+        )
+        response = self.autorized_client.post(
+            reverse("posts:post_create"), self.form)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFormError(
+            response, "form", "image",
+            "Не удалось прочитать картинку: файл повреждён.")
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_SIZE=(100, 100))
+    def test_create_post_animation_ingested(self):
+        """Анимация уменьшается покадрово и перекодируется в WebP."""
+        frames = [Image.new("RGB", (400, 200), color)
+                  for color in ("red", "green", "blue")]
+        buffer = BytesIO()
+        frames[0].save(buffer, "GIF", save_all=True,
+                       append_images=frames[1:], duration=50, loop=0,
+                       comment=b"metadata")
+        self.form["image"] = SimpleUploadedFile(
+            name="animation.gif", content=buffer.getvalue(),
+            content_type="image/gif",
+        )
+        self.autorized_client.post(reverse("posts:post_create"), self.form)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith(".webp"))
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.n_frames, len(frames))
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn("comment", image.info)
+
     def test_not_create_post_not_authorized_client(self):
         """Неавторизованный пользователь не может создать пост."""
         response = self.client.post(reverse("posts:post_create"), self.form)
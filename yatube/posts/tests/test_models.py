@@ -1,10 +1,30 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from ..models import Group, Post
+from .. import signals
+from ..feeds import FOLLOW_FEED_ORDERING, get_follow_feed
+from ..paginator import KeysetPaginator
+from ..management.commands import gc_images
+from ..models import (Comment, FeedItem, Follow, Group, Post, SearchTerm,
+                      UserStats)
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -35,3 +55,294 @@ class PostModelTest(TestCase):
                     model_str.__str__(),
                     expected_value,
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="counter")
+        cls.group = Group.objects.create(
+            title="Группа со счётчиком",
+            slug="counted",
+            description="Тестовое описание",
+        )
+        cls.other_group = Group.objects.create(
+            title="Другая группа",
+            slug="other",
+            description="Тестовое описание",
+        )
+
+    def counters(self):
+        return (
+            UserStats.objects.get(user=self.user).posts_count,
+            Group.objects.get(pk=self.group.pk).posts_count,
+            Group.objects.get(pk=self.other_group.pk).posts_count,
+        )
+
+    def test_counters_follow_create_move_and_delete(self):
+        """Счётчики постов меняются при создании, переносе и удалении."""
+        post = Post.objects.create(
+            author=self.user, text="пост", group=self.group)
+        self.assertEqual(self.counters(), (1, 1, 0))
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counters(), (1, 0, 1))
+        post.delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_reconcile_counters_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        Post.objects.bulk_create(
+            [Post(author=self.user, text="пост", group=self.group)] * 3)
+        call_command("reconcile_counters", stdout=StringIO())
+        self.assertEqual(self.counters(), (3, 3, 0))
+
+    def test_comments_count_follows_add_delete_and_reconcile(self):
+        """Счётчик комментариев меняется при добавлении и удалении и
+        исправляется командой reconcile_counters."""
+        post = Post.objects.create(author=self.user, text="пост")
+        comment = Comment.objects.create(
+            post=post, author=self.user, text="комментарий")
+        Comment.objects.create(post=post, author=self.user, text="ещё")
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.user, text="без сигналов")] * 2)
+        call_command("reconcile_counters", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 3)
+
+    def test_post_delete_skips_comment_counter_updates(self):
+        """Удаление поста не обновляет его счётчик и кеш страниц на
+        каждый удаляемый каскадом комментарий."""
+        queries = []
+        for comments in (1, 10):
+            post = Post.objects.create(author=self.user, text="пост")
+            for _ in range(comments):
+                Comment.objects.create(
+                    post=post, author=self.user, text="комментарий")
+            with mock.patch.object(
+                    signals, "bump_page_version") as bump_page_version, \
+                    CaptureQueriesContext(connection) as captured:
+                post.delete()
+            self.assertEqual(bump_page_version.call_count, 1)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        comment = Comment.objects.create(
+            post=Post.objects.create(author=self.user, text="пост"),
+            author=self.user, text="комментарий")
+        comment.delete()
+        self.assertEqual(Post.objects.get(
+            pk=comment.post_id).comments_count, 0)
+
+
+class UserDeleteTest(TransactionTestCase):
+    def test_delete_user_with_posts_comments_and_follows(self):
+        """Пользователь удаляется вместе с постами, комментариями и
+        подписками, а счётчики других авторов остаются верными."""
+        user = User.objects.create_user(username="Leaving")
+        other = User.objects.create_user(username="Staying")
+        post = Post.objects.create(author=user, text="пост")
+        other_post = Post.objects.create(author=other, text="чужой пост")
+        Comment.objects.create(post=post, author=other, text="ответ")
+        Comment.objects.create(post=other_post, author=user, text="ответ")
+        Follow.objects.create(user=user, author=other)
+        Follow.objects.create(user=other, author=user)
+        user.delete()
+        self.assertFalse(User.objects.filter(username="Leaving").exists())
+        self.assertFalse(UserStats.objects.filter(user_id=user.pk).exists())
+        self.assertEqual(other.stats.posts_count, 1)
+        other_post.refresh_from_db()
+        self.assertEqual(other_post.comments_count, 0)
+        self.assertFalse(Follow.objects.exists())
+
+
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="indexed")
+        cls.group = Group.objects.create(
+            title="Группа", slug="indexed", description="Описание")
+        cls.post = Post.objects.create(
+            author=cls.user, text="пост", group=cls.group)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return " ".join(row[-1] for row in cursor.fetchall())
+
+    @skipUnless(connection.vendor == "sqlite", "План запроса SQLite")
+    def test_feeds_use_indexes_without_sorting(self):
+        """Ленты и комментарии читаются по индексу без сортировки."""
+        ordering = ("-pub_date", "-id")
+        querysets = (
+            Post.objects.order_by(*ordering)[:10],
+            Post.objects.filter(author=self.user).order_by(*ordering)[:10],
+            Post.objects.filter(group=self.group).order_by(*ordering)[:10],
+            Comment.objects.filter(post=self.post).order_by("created")[:10],
+            get_follow_feed(self.user).for_feed()
+            .order_by(*FOLLOW_FEED_ORDERING)[:10],
+        )
+        for queryset in querysets:
+            with self.subTest(query=str(queryset.query)):
+                plan = self.query_plan(queryset)
+                self.assertRegex(plan, "USING (COVERING )?INDEX")
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    @skipUnless(connection.vendor == "sqlite", "План запроса SQLite")
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_follow_feed_with_celebrities_merges_index_ranges(self):
+        """С подпиской на знаменитость лента подписок сливает диапазоны
+        индексов и листается курсором без пропусков и повторов."""
+        reader = User.objects.create_user(username="reader")
+        star = User.objects.create_user(username="star")
+        Follow.objects.create(user=reader, author=self.user)
+        Follow.objects.create(user=reader, author=star)
+        Follow.objects.create(user=self.user, author=star)
+        # Пост, розданный, пока автор ещё не был знаменитостью.
+        FeedItem.objects.create(user=reader, post=Post.objects.create(
+            author=star, text="старый"), pub_date=timezone.now())
+        for number in range(5):
+            Post.objects.create(author=star, text=f"звезда {number}")
+            Post.objects.create(author=self.user, text=f"обычный {number}")
+        cache.clear()
+        feed = get_follow_feed(reader).for_feed().order_by(
+            *FOLLOW_FEED_ORDERING)
+        self.assertEqual(len(feed.querysets), 2)
+        paginator = KeysetPaginator(feed, 3, ordering=FOLLOW_FEED_ORDERING)
+        page = paginator.first_page()
+        seen = list(page)
+        for queryset in paginator.object_list.filter(paginator._beyond(
+                paginator.decode_cursor(paginator.next_cursor(page)),
+                True)).querysets:
+            with self.subTest(query=str(queryset.query)):
+                plan = self.query_plan(queryset[:4])
+                self.assertRegex(plan, "USING (COVERING )?INDEX")
+                self.assertNotIn("TEMP B-TREE", plan)
+        while page.has_next():
+            page = paginator.cursor_page(after=paginator.next_cursor(page))
+            seen.extend(page)
+        expected = list(Post.objects.filter(
+            author__in=[self.user, star]).order_by("-pub_date", "-id"))
+        self.assertEqual(seen, expected)
+        back = paginator.cursor_page(before=paginator.previous_cursor(page))
+        end = len(seen) - len(page)
+        self.assertEqual(list(back), seen[end - 3:end])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageStorageTest(TestCase):
+    IMAGE = (
+        b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21"
+        b"\xF9\x04\x01\x00\x00\x00\x00\x2C\x00\x00\x00\x00\x01\x00"
+        b"\x01\x00\x00\x02\x00\x3B"
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Storage")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text="Пост с картинкой",
+            image=SimpleUploadedFile(name, self.IMAGE, "image/gif"),
+        )
+
+    def test_identical_uploads_share_file_and_gc_removes_unused(self):
+        """Одинаковые загрузки хранятся один раз, лишние файлы удаляются."""
+        first = self.create_post("image.gif")
+        second = self.create_post("other.gif")
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        first.delete()
+        call_command("gc_images", min_age=0, stdout=StringIO())
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        call_command("gc_images", min_age=0, force=True, stdout=StringIO())
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_identical_upload_touches_existing_file(self):
+        """Повторная загрузка обновляет время файла, и gc его не трогает."""
+        post = self.create_post("image.gif")
+        storage = post.image.storage
+        path = storage.path(post.image.name)
+        os.utime(path, (0, 0))
+        post.delete()
+        self.create_post("again.gif")
+        self.assertGreater(os.path.getmtime(path), 0)
+        call_command(
+            "gc_images", min_age=60, force=True, stdout=StringIO())
+        self.assertTrue(storage.exists(post.image.name))
+
+    def test_gc_rechecks_references_before_delete(self):
+        """Файл, на который сослались во время обхода, не удаляется."""
+        post = self.create_post("image.gif")
+        name = post.image.name
+        post.delete()
+        command = gc_images.Command(stdout=StringIO())
+        references = command.references
+
+        def references_then_upload():
+            result = references()
+            self.create_post("late.gif")
+            return result
+
+        command.references = references_then_upload
+        call_command(command, min_age=0, force=True)
+        self.assertTrue(post.image.storage.exists(name))
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_creates_consistent_data(self):
+        """seed_yatube создаёт данные и пересчитывает производные."""
+        call_command(
+            "seed_yatube", users=20, groups=3, posts=50, comments=30,
+            follows=5, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 30)
+        posts = Post.objects.order_by("pk")
+        self.assertEqual(posts.count(), 50)
+        dates = list(posts.values_list("pub_date", flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(
+            sum(UserStats.objects.values_list("posts_count", flat=True)), 50)
+        self.assertFalse(Follow.objects.filter(
+            user=models.F("author")).exists())
+        self.assertTrue(SearchTerm.objects.exists())
+        feed = {
+            (user_id, post_id)
+            for user_id, author_id in Follow.objects.values_list(
+                "user_id", "author_id")
+            for post_id in Post.objects.filter(
+                author_id=author_id).values_list("id", flat=True)
+        }
+        self.assertTrue(feed)
+        self.assertEqual(
+            set(FeedItem.objects.values_list("user_id", "post_id")), feed)
+
+
+@skipUnless(connection.vendor == "sqlite", "PRAGMA есть только в SQLite")
+class SqlitePragmasTest(TestCase):
+    def test_connection_configured(self):
+        """Соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            for name in ("busy_timeout", "cache_size"):
+                with self.subTest(pragma=name):
+                    cursor.execute(f"PRAGMA {name}")
+                    self.assertEqual(
+                        cursor.fetchone()[0], settings.SQLITE_PRAGMAS[name])
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..paginator import KeysetPaginator
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    POSTS_ALL = 25
+    POSTS_IN_PAGE = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Keyset")
+        Post.objects.bulk_create(
+            Post(text=f"Пост {number}", author=cls.user)
+            for number in range(cls.POSTS_ALL)
+        )
+        cls.url = reverse("posts:profile", args=[cls.user.username])
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_cursor_pages_walk_all_posts(self):
+        """Переход по курсорам `after` проходит все посты без повторов."""
+        response = self.client.get(self.url)
+        page_obj = response.context["page_obj"]
+        seen = [post.id for post in page_obj]
+        while page_obj.has_next():
+            cursor = page_obj.paginator.next_cursor(page_obj)
+            response = self.client.get(self.url, {"after": cursor})
+            page_obj = response.context["page_obj"]
+            seen.extend(post.id for post in page_obj)
+        expected = list(
+            Post.objects.order_by("-pub_date", "-id").values_list(
+                "id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_before_returns_previous_page(self):
+        """Курсор `before` возвращает предыдущую страницу."""
+        first_page = self.client.get(self.url).context["page_obj"]
+        cursor = first_page.paginator.next_cursor(first_page)
+        second_page = self.client.get(
+            self.url, {"after": cursor}).context["page_obj"]
+        cursor = second_page.paginator.previous_cursor(second_page)
+        previous_page = self.client.get(
+            self.url, {"before": cursor}).context["page_obj"]
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+        self.assertTrue(previous_page.has_next())
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        paginator = KeysetPaginator(Post.objects.all(), self.POSTS_IN_PAGE)
+        cursor = paginator.encode_cursor(Post.objects.last())
+        page_obj = paginator.get_cursor_page(before=cursor)
+        self.assertEqual(len(page_obj), self.POSTS_IN_PAGE)
+        self.assertNotIn("count", paginator.__dict__)
+
+    def test_first_page_does_not_count(self):
+        """Первая страница для листания по курсору без COUNT(*)."""
+        paginator = KeysetPaginator(Post.objects.all(), self.POSTS_IN_PAGE)
+        with self.assertNumQueries(1):
+            page_obj = paginator.first_page()
+        self.assertEqual(len(page_obj), self.POSTS_IN_PAGE)
+        self.assertTrue(page_obj.has_next())
+        self.assertFalse(page_obj.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу."""
+        first_page = self.client.get(self.url).context["page_obj"]
+        response = self.client.get(self.url, {"after": "не-курсор"})
+        self.assertEqual(list(response.context["page_obj"]), list(first_page))
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_feed_links_use_cursors_without_count(self):
+        """Лента без параметров не считает посты, а ссылки пагинатора
+        ведут по курсорам, без номеров страниц."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertFalse(
+            [query["sql"] for query in queries if "COUNT(*)" in query["sql"]])
+        page_obj = response.context["page_obj"]
+        self.assertContains(
+            response, f"?after={page_obj.paginator.next_cursor(page_obj)}")
+        self.assertNotContains(response, "page=")
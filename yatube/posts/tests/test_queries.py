@@ -0,0 +1,128 @@
+from importlib import import_module
+from io import StringIO
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from ..models import Group, Post, User
+
+URL_MODULES = ("posts.urls", "users.urls", "about.urls")
+# Наибольшее число SQL-запросов на адрес при пустом кеше. Бюджет не
+# зависит от размера страницы: рост числа запросов вместе с числом
+# постов или комментариев — это N+1.
+QUERY_BUDGETS = {
+    # Сессия, пользователь и страница постов без COUNT(*).
+    "posts:index": 3,
+    # Плюс группа.
+    "posts:group_list": 4,
+    # Плюс подписки и проверка знаменитостей среди авторов; за каждую
+    # знаменитость — ещё запрос её диапазона постов (здесь их нет).
+    "posts:follow_index": 6,
+    # Плюс частоты слов запроса и группы для фильтра формы.
+    "posts:search": 7,
+    # Плюс автор, подписки читателя и число подписчиков автора.
+    "posts:profile": 6,
+    "posts:profile_follow": 6,
+    # Плюс число подписчиков автора до удаления подписки.
+    "posts:profile_unfollow": 7,
+    "posts:add_comment": 3,
+    "posts:post_edit": 5,
+    "posts:post_detail": 5,
+    # Сессия, пользователь, состояние поста и порция комментариев.
+    "posts:post_comments": 4,
+    "posts:post_create": 3,
+    # Сессия и пользователь.
+    "users:signup": 2,
+    "users:logout": 4,
+    "users:login": 2,
+    "users:change_done": 2,
+    "users:password_change": 2,
+    "users:password_reset": 2,
+    "users:reset_done": 2,
+    "users:reset_confirm": 3,
+    "users:resset_done": 2,
+    "about:author": 2,
+    "about:tech": 2,
+}
+QUERY_PARAMS = {
+    "posts:search": {"q": "кот"},
+}
+PAGE_SIZES = (5, 20)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            "seed_yatube", users=40, groups=5, posts=400, comments=600,
+            follows=10, stdout=StringIO(),
+        )
+        cls.user = User.objects.annotate(
+            follows=Count("follower")).order_by("-follows", "pk").first()
+        author = User.objects.annotate(
+            total=Count("posts")).order_by("-total", "pk").first()
+        post = Post.objects.filter(author=cls.user).annotate(
+            total=Count("comments")).order_by("-total", "pk").first()
+        cls.params = {
+            "username": author.username,
+            "slug": Group.objects.order_by("-posts_count").first().slug,
+            "post_id": post.pk,
+            "uidb64": urlsafe_base64_encode(force_bytes(cls.user.pk)),
+            "token": default_token_generator.make_token(cls.user),
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def urls(self):
+        for module_name in URL_MODULES:
+            module = import_module(module_name)
+            for pattern in module.urlpatterns:
+                name = f"{module.app_name}:{pattern.name}"
+                kwargs = {key: self.params[key]
+                          for key in pattern.pattern.converters}
+                yield name, reverse(name, kwargs=kwargs)
+
+    def count_queries(self, name, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, QUERY_PARAMS.get(name))
+        # Выход из аккаунта обнуляет сессию клиента.
+        self.client.force_login(self.user)
+        return response, queries
+
+    def test_views_within_query_budget(self):
+        """Число запросов каждого адреса в бюджете и не растёт со страницей."""
+        for name, url in self.urls():
+            with self.subTest(view=name):
+                self.assertIn(name, QUERY_BUDGETS, "У адреса нет бюджета.")
+                counts = []
+                for page_size in PAGE_SIZES:
+                    with override_settings(COUNT_POST_IN_LIST=page_size):
+                        response, queries = self.count_queries(name, url)
+                    counts.append(len(queries))
+                    sql = "\n".join(
+                        f"{number}. {query['sql']}"
+                        for number, query in enumerate(queries, start=1)
+                    )
+                    self.assertLessEqual(
+                        len(queries), QUERY_BUDGETS[name],
+                        f"{name} при странице из {page_size} постов:\n{sql}",
+                    )
+                if response.context is None \
+                        or "page_obj" not in response.context:
+                    continue
+                self.assertEqual(
+                    counts[0], counts[1],
+                    f"{name}: число запросов зависит от размера страницы",
+                )
@@ -0,0 +1,128 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post, SearchTerm
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Searcher")
+        cls.other_author = User.objects.create_user(username="Other")
+        cls.group = Group.objects.create(
+            title="Коты", slug="cats", description="Про котов")
+        cls.best = Post.objects.create(
+            text="Кот, кот и ещё раз кот спит", author=cls.author,
+            group=cls.group)
+        cls.good = Post.objects.create(
+            text="Кот спит на окне", author=cls.other_author)
+        Post.objects.create(text="Собака спит", author=cls.author)
+        cls.url = reverse("posts:search")
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        return list(response.context["page_obj"])
+
+    def test_results_ranked_and_filtered(self):
+        """Находятся посты со всеми словами запроса, лучшие — первыми."""
+        self.assertEqual(self.search(q="спит КОТ"), [self.best, self.good])
+        self.assertEqual(
+            self.search(q="кот", author="Other"), [self.good])
+        self.assertEqual(self.search(q="кот", group="cats"), [self.best])
+        self.assertEqual(self.search(q="кот жираф"), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.create(text="Жираф", author=self.author)
+        self.assertEqual(self.search(q="жираф"), [post])
+        post.text = "Слон"
+        post.save()
+        self.assertEqual(self.search(q="жираф"), [])
+        self.assertEqual(self.search(q="слон"), [post])
+        post.delete()
+        self.assertFalse(SearchTerm.objects.filter(term="слон").exists())
+
+    def test_rebuild_indexes_in_batches(self):
+        """Пересборка пачками даёт тот же индекс, что и сигналы."""
+        def index():
+            return sorted(SearchTerm.objects.values_list(
+                "post_id", "term", "weight"))
+
+        expected = index()
+        with mock.patch.object(search, "SEARCH_BATCH_SIZE", 2):
+            call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(index(), expected)
+
+    def test_cursor_pages_keep_query(self):
+        """Курсоры проходят все результаты, ссылки сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(text=f"кот {'кот ' * number}", author=self.author)
+            for number in range(15)
+        )
+        call_command("rebuild_search_index", stdout=StringIO())
+        response = self.client.get(self.url, {"q": "кот"})
+        page_obj = response.context["page_obj"]
+        self.assertContains(response, "q=%D0%BA%D0%BE%D1%82&amp;after=")
+        seen = [post.id for post in page_obj]
+        while page_obj.has_next():
+            cursor = page_obj.paginator.next_cursor(page_obj)
+            page_obj = self.client.get(
+                self.url, {"q": "кот", "after": cursor}
+            ).context["page_obj"]
+            seen.extend(post.id for post in page_obj)
+        self.assertEqual(
+            sorted(seen), sorted(
+                Post.objects.exclude(text="Собака спит").values_list(
+                    "id", flat=True))
+        )
+        self.assertEqual(len(seen), len(set(seen)))
+
+
+class SearchMigrationTest(TransactionTestCase):
+    BEFORE = [("posts", "0013_auto_20261017_0639")]
+    AFTER = [("posts", "0014_auto_20261017_0641")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_migration_fills_index_like_application(self):
+        """Миграция заполняет индекс так же, как приложение."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.BEFORE)
+        apps = executor.loader.project_state(self.BEFORE).apps
+        author = apps.get_model("auth", "User").objects.create(
+            username="Migrated")
+        texts = ["Ёжик и ёлка, ёжик!", "Кот спит", "а б ВВ"]
+        Post = apps.get_model("posts", "Post")
+        ids = [Post.objects.create(text=text, author_id=author.pk).pk
+               for text in texts]
+        executor.loader.build_graph()
+        executor.migrate(self.AFTER)
+        apps = executor.loader.project_state(self.AFTER).apps
+        terms = apps.get_model("posts", "SearchTerm").objects.values_list(
+            "post_id", "term", "weight")
+        expected = [
+            (term.post_id, term.term, term.weight)
+            for post_id, text in zip(ids, texts)
+            for term in search.search_terms(post_id, text)
+        ]
+        self.assertEqual(sorted(terms), sorted(expected))
@@ -1,13 +1,31 @@
+import hashlib
+import json
 import shutil
 import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
-from django.urls import reverse
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+from django.utils.http import http_date
+from sorl.thumbnail import default
 
+from core import thumbnails
+from core.locks import acquire_lock, release_lock
+from .. import cache as page_cache
+from ..cache import (PAGE_LOCK_KEY, PAGE_LOCK_TIMEOUT, bump_page_version,
+                     get_card_metrics, reset_card_metrics)
+from ..follows import FOLLOWERS_COUNT_KEY
 from ..models import Follow, Group, Post
 
 User = get_user_model()
@@ -26,6 +44,13 @@ class ViewsTests(TestCase):
     DELETE_POST = 1
     ADD_FOLLOWER = 1
     DELETE_FOLLOWER = 0
+    # Сессия, пользователь, валидаторы ETag, пост с автором и группой,
+    # комментарии.
+    POST_DETAIL_QUERIES = 5
+    # Страница постов с авторами и группами, без подсчёта постов.
+    INDEX_QUERIES = 1
+    # Группа и страница постов с авторами.
+    GROUP_LIST_QUERIES = 2
 
     @classmethod
     def setUpClass(cls):
@@ -97,6 +122,7 @@ class ViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.autorized_user_client = Client()
         self.follower_user_client = Client()
@@ -110,10 +136,29 @@ class ViewsTests(TestCase):
             (response_post.author, ViewsTests.post.author),
             (response_post.group, ViewsTests.post.group),
             (response_post.image.size, ViewsTests.uploaded.size),
-            (response_post.image.name, f"posts/{ViewsTests.uploaded.name}"),
+            (response_post.image.name, ViewsTests.post.image.name),
         )
         return value_fields_post
 
+    def test_thumbnail_generated_in_background(self):
+        """Пока миниатюра создаётся в фоне, показывается исходник."""
+        url = reverse("posts:post_detail", args=[ViewsTests.post.id])
+        with mock.patch.object(thumbnails, "get_executor") as executor, \
+                mock.patch.object(thumbnails.transaction, "on_commit",
+                                  side_effect=lambda func: func()):
+            response = self.client.get(url)
+        self.assertContains(response, ViewsTests.post.image.url)
+        submit = executor.return_value.submit
+        submit.assert_called_once()
+        _, file_, geometry, options = submit.call_args[0]
+        thumbnails.generate_thumbnail(file_, geometry, options)
+        thumbnail = default.backend.get_thumbnail(file_, geometry, **options)
+        # Готовая миниатюра меняет ETag: браузер не оставит у себя
+        # страницу с исходником.
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertContains(response, thumbnail.url)
+
     def test_unexisting_page(self):
         """Проверка шаблона несуществующей страницы"""
         url_unexisting = "/unexisting_page/"
@@ -245,14 +290,103 @@ class ViewsTests(TestCase):
         comment_text = {"text": "Создаем комментарий к посту"}
         self.autorized_user_client.post(self.name_url_comments, comment_text)
         response = self.autorized_user_client.get(name_url_detail_add_comment)
-        response_comment_text = (
-            response.context["comments"].get(text=comment_text["text"]).text
-        )
         self.assertEqual(
             len(response.context["comments"]),
             count_comment + self.ADD_POST_OR_COMMENT
         )
-        self.assertEqual(response_comment_text, comment_text["text"])
+        self.assertIn(
+            comment_text["text"],
+            [comment.text for comment in response.context["comments"]],
+        )
+
+    def test_feed_queries_do_not_depend_on_authors(self):
+        """Число запросов лент не зависит от числа авторов и групп."""
+        for number in range(self.POSTS_IN_PAGE_1_PAGINATOR):
+            Post.objects.create(
+                text="Пост другого автора",
+                author=User.objects.create_user(username=f"author_{number}"),
+                group=Group.objects.create(
+                    title=f"Группа {number}", slug=f"group-{number}"),
+            )
+        feeds = (
+            (reverse("posts:index"), self.INDEX_QUERIES),
+            (reverse("posts:group_list", args=["group-0"]),
+                self.GROUP_LIST_QUERIES),
+        )
+        for url, queries in feeds:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.client.get(url)
+
+    def test_feed_thumbnails_prefetched_in_one_query(self):
+        """Метаданные миниатюр страницы читаются одним запросом."""
+        for number in range(self.POSTS_IN_PAGE_1_PAGINATOR):
+            Post.objects.create(
+                text=f"Пост с картинкой {number}",
+                author=ViewsTests.user,
+                image=f"posts/image_{number}.gif",
+            )
+        cache.clear()
+        with self.assertNumQueries(self.INDEX_QUERIES + 1):
+            self.client.get(reverse("posts:index"))
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не зависит от комментариев."""
+        url = self.name_urls_public_template[3][0]
+        # Первый просмотр создаёт миниатюру картинки поста.
+        self.autorized_user_client.get(url)
+        for number in range(20):
+            commentator = User.objects.create_user(
+                username=f"commentator_{number}")
+            ViewsTests.post.comments.create(
+                author=commentator, text="Комментарий")
+            with self.subTest(comments=number + 1):
+                with self.assertNumQueries(self.POST_DETAIL_QUERIES):
+                    self.autorized_user_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.autorized_user_client.get(url)
+        # Время изменения комментариев хранится в посте, без MAX по ним.
+        self.assertFalse(
+            any("MAX(" in query["sql"] for query in queries.captured_queries))
+
+    @override_settings(COUNT_COMMENTS_IN_PAGE=3)
+    def test_comments_loaded_by_cursor(self):
+        """Страница поста показывает первую порцию комментариев, а
+        остальные отдаются фрагментом по курсору."""
+        ViewsTests.post.comments.all().delete()
+        texts = [f"Комментарий {number}" for number in range(5)]
+        for text in texts:
+            ViewsTests.post.comments.create(author=ViewsTests.user, text=text)
+        url = self.name_urls_public_template[3][0]
+        response = self.client.get(url)
+        page = response.context["comments"]
+        self.assertEqual([comment.text for comment in page], texts[:3])
+        more_url = (
+            reverse("posts:post_comments", args=[ViewsTests.post.id])
+            + f"?after={page.paginator.next_cursor(page)}"
+        )
+        self.assertContains(response, more_url)
+        response = self.client.get(more_url)
+        self.assertTemplateUsed(response, "posts/includes/comments.html")
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            texts[3:],
+        )
+        self.assertNotContains(response, "Показать ещё")
+        # Без JavaScript ссылка открывает всю страницу поста.
+        detail_more_url = f"{url}?after={page.paginator.next_cursor(page)}"
+        self.assertContains(self.client.get(url), detail_more_url)
+        response = self.client.get(detail_more_url)
+        self.assertTemplateUsed(response, "posts/post_detail.html")
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            texts[3:],
+        )
+        self.assertEqual(
+            self.client.get(reverse("posts:post_comments", args=[0]))
+            .status_code,
+            HTTPStatus.NOT_FOUND,
+        )
 
     def test_comment_not_authorized_user(self):
         """Проверка комментирования поста неавторизированным пользователем."""
@@ -299,6 +433,153 @@ class ViewsTests(TestCase):
             with self.subTest(count=count):
                 self.assertEqual(count, value)
 
+    def test_cache_pages_until_change(self):
+        """Страницы лент берутся из кеша, пока посты не изменились."""
+        for url_name, template in ViewsTests.name_urls_paginator_template:
+            with self.subTest(url_name=url_name):
+                self.client.get(url_name)
+                response_cached = self.client.get(url_name)
+                self.assertTemplateNotUsed(response_cached, template)
+                new_post = Post.objects.create(
+                    text="Пост после кеширования",
+                    author=ViewsTests.user,
+                    group=ViewsTests.group_1,
+                )
+                response = self.client.get(url_name)
+                self.assertEqual(response.context["page_obj"][0], new_post)
+
+    def test_cached_page_shared_between_users(self):
+        """Кешированная страница общая, а шапка и кнопки — у каждого свои."""
+        url = reverse("posts:profile", args=[ViewsTests.user.username])
+        self.client.get(url)
+        response = self.follower_user_client.get(url)
+        self.assertTemplateNotUsed(response, "posts/profile.html")
+        self.assertContains(response, "Follower")
+        self.assertContains(response, "Подписаться")
+        response = self.autorized_user_client.get(url)
+        self.assertContains(response, "Vasya")
+        self.assertNotContains(response, "Подписаться")
+        self.assertNotContains(response, "<!--hole:")
+        # Вкладки главной зависят от входа, а не от того, кто первым
+        # положил страницу в кеш.
+        url = reverse("posts:index")
+        for first, second in ((self.client, self.follower_user_client),
+                              (self.follower_user_client, self.client)):
+            cache.clear()
+            first.get(url)
+            for client in (first, second):
+                with self.subTest(client=client):
+                    response = client.get(url)
+                    tab = self.assertContains if (
+                        response.wsgi_request.user.is_authenticated
+                    ) else self.assertNotContains
+                    tab(response, "Избранные авторы")
+                    self.assertNotContains(response, "<!--hole:")
+
+    def test_feed_cards_show_comments_count(self):
+        """Карточки показывают число комментариев без лишних запросов."""
+        post = Post.objects.create(text="Обсуждаемый", author=ViewsTests.user)
+        for number in range(2):
+            post.comments.create(
+                author=ViewsTests.user, text=f"Комментарий {number}")
+        cache.clear()
+        # Плюс метаданные миниатюры картинки поста из setUpClass.
+        with self.assertNumQueries(self.INDEX_QUERIES + 1):
+            response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Комментариев: 2")
+
+    def test_post_cards_cached_until_post_changes(self):
+        """Карточка поста берётся из кеша, пока пост не изменится."""
+        post = Post.objects.create(text="Карточка", author=ViewsTests.user)
+        reset_card_metrics()
+        self.client.get(reverse("posts:index"))
+        bump_page_version()
+        self.client.get(reverse("posts:index"))
+        # Карточка с ещё не готовой миниатюрой не кешируется.
+        self.assertEqual(get_card_metrics(), {"hits": 1, "misses": 3})
+        post.text = "Исправленная карточка"
+        post.save()
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "Исправленная карточка")
+
+    def test_conditional_get_feeds_and_post(self):
+        """Неизменившиеся страницы отдаются как 304 Not Modified."""
+        index_url = reverse("posts:index")
+        detail_url = reverse("posts:post_detail", args=[ViewsTests.post.id])
+        etags = {
+            url: self.client.get(url)["ETag"]
+            for url in (index_url, detail_url)
+        }
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                response = self.autorized_user_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        ViewsTests.post.comments.create(
+            author=ViewsTests.follower_user, text="Новый комментарий")
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_ignores_if_modified_since(self):
+        """Страница поста сверяется только по ETag: дата изменения поста
+        не учитывает зрителя, автора и группу."""
+        detail_url = reverse("posts:post_detail", args=[ViewsTests.post.id])
+        comments_url = reverse("posts:post_comments",
+                               args=[ViewsTests.post.id])
+        since = http_date(time.time() + 3600)
+        response = self.client.get(detail_url)
+        self.assertNotIn("Last-Modified", response)
+        response = self.autorized_user_client.get(
+            detail_url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        Post.objects.filter(pk=ViewsTests.post.pk).update(
+            group=ViewsTests.group_2)
+        for url in (detail_url, comments_url):
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_stale_page_not_confirmed_by_etag(self):
+        """Устаревшая страница получает ETag своей версии, а не текущей,
+        и браузер не закрепляет её ответом 304."""
+        url = reverse("posts:index")
+        self.client.get(url)
+        post = ViewsTests.post
+        post.text = "Исправленный текст"
+        post.save()
+        # Страницу пересчитывает другой запрос: отдаётся прежняя версия.
+        lock_key = PAGE_LOCK_KEY.format(hashlib.md5(url.encode()).hexdigest())
+        lock = acquire_lock(lock_key, PAGE_LOCK_TIMEOUT)
+        stale = self.client.get(url)
+        self.assertNotContains(stale, "Исправленный текст")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        release_lock(lock_key, lock)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+        self.assertContains(response, "Исправленный текст")
+        self.assertNotEqual(response["ETag"], stale["ETag"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_deleted_post_not_served_from_stale_page(self):
+        """Страница с удалённым постом не отдаётся во время пересчёта."""
+        url = reverse("posts:index")
+        post = Post.objects.create(text="Удаляемый пост", author=self.user)
+        self.assertContains(self.client.get(url), "Удаляемый пост")
+        lock_key = PAGE_LOCK_KEY.format(hashlib.md5(url.encode()).hexdigest())
+        lock = acquire_lock(lock_key, PAGE_LOCK_TIMEOUT)
+        post.delete()
+        with mock.patch.object(page_cache, "PAGE_WAIT_TIMEOUT", 0.1):
+            response = self.client.get(url)
+        release_lock(lock_key, lock)
+        self.assertNotContains(response, "Удаляемый пост")
+
     def test_follow_authorized_user(self):
         """Авторизированный пользователь может подписываться и отписываться."""
         for url_follow, follow in ViewsTests.name_url_follow:
@@ -341,3 +622,140 @@ class ViewsTests(TestCase):
             len(response_follower_after_add_post.context["page_obj"]),
             count_post_follow
         )
+
+
+class BenchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Bench")
+        cls.group = Group.objects.create(
+            title="Замеры", slug="bench", description="Группа замеров")
+        Post.objects.create(text="Пост для замеров", author=cls.user,
+                            group=cls.group)
+
+    def bench(self, **options):
+        options.setdefault("force", True)
+        call_command("bench_views", repeat=1, warmup=0, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+
+    def test_bench_views_refuses_to_clear_cache_without_force(self):
+        """Без --force замеры не очищают общий кеш."""
+        cache.set("bench:marker", True)
+        with self.assertRaisesMessage(CommandError, "--force"):
+            self.bench(force=False)
+        self.assertTrue(cache.get("bench:marker"))
+        self.bench(force=False, warm_cache=True)
+
+    def test_bench_views_reports_and_compares(self):
+        """Замеры пишутся в JSON, рост числа запросов — регрессия."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/bench.json"
+            self.bench(output=path)
+            with open(path) as output:
+                results = json.load(output)
+            views = results["views"]
+            self.assertIn("posts:index", views)
+            self.assertIn("about:tech", views)
+            self.assertNotIn("users:logout", views)
+            for name, result in views.items():
+                with self.subTest(view=name):
+                    self.assertNotIn("error", result)
+            views["posts:index"]["queries"] -= 1
+            with open(path, "w") as output:
+                json.dump(results, output)
+            with self.assertRaisesMessage(CommandError, "posts:index"):
+                self.bench(compare=path, min_ms=1e6)
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Timing")
+        Post.objects.create(text="Пост для замеров", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header_and_log(self):
+        """Время SQL и шаблонов и попадания в кеши видны в ответе и журнале."""
+        with self.assertLogs("core.timing", "INFO") as logs:
+            first = self.client.get(reverse("posts:index"))
+            second = self.client.get(reverse("posts:index"))
+        header = first["Server-Timing"]
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(header, r"tpl;dur=[\d.]+")
+        self.assertIn('cache-page;desc="hit=0 miss=1"', header)
+        self.assertIn('cache-card;desc="hit=0 miss=1"', header)
+        self.assertIn('cache-page;desc="hit=1 miss=0"',
+                      second["Server-Timing"])
+        self.assertIn("path=/ status=200", logs.output[0])
+        self.assertIn("page_hits=1", logs.output[1])
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    # Резервное копирование SQLite ждёт конца транзакции, поэтому
+    # тесты не оборачиваются в неё.
+
+    def setUp(self):
+        cache.clear()
+        replica = tempfile.NamedTemporaryFile(suffix=".sqlite3")
+        self.addCleanup(replica.close)
+        databases = mock.patch.dict(connections.databases, {
+            "replica": {**connection.settings_dict, "NAME": replica.name},
+        })
+        databases.start()
+        self.addCleanup(databases.stop)
+        self.addCleanup(self.close_replica)
+        self.user = User.objects.create_user(username="Replica")
+        Post.objects.create(text="Пост из реплики", author=self.user)
+        call_command("sync_replica", stdout=StringIO())
+        self.client.force_login(self.user)
+
+    def close_replica(self):
+        connections["replica"].close()
+        del connections["replica"]
+
+    def replica_queries(self, client, text="Пост из реплики",
+                        url=reverse_lazy("posts:index")):
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = client.get(url)
+        self.assertContains(response, text)
+        return len(queries)
+
+    def test_feeds_read_from_replica_within_max_lag(self):
+        """Чужие записи не уводят чтения из реплики, пока она отстаёт
+        не больше REPLICA_MAX_LAG."""
+        self.assertGreater(self.replica_queries(self.client), 0)
+        Post.objects.create(text="Ещё не в реплике", author=self.user)
+        response = Client().get(reverse("posts:index"))
+        self.assertNotContains(response, "Ещё не в реплике")
+        # Страница из отстающей реплики не закешировалась как текущая.
+        with override_settings(REPLICA_MAX_LAG=0):
+            self.assertEqual(self.replica_queries(
+                Client(), "Ещё не в реплике"), 0)
+
+    def test_follow_graph_cached_from_primary(self):
+        """Граф подписок кешируется из основной базы, а не из реплики."""
+        fan = User.objects.create_user(username="Fan")
+        Follow.objects.create(user=fan, author=self.user)
+        # Сигналы подписки уже прочитали число подписчиков из основной
+        # базы; первым его читает просмотр профиля.
+        cache.delete(FOLLOWERS_COUNT_KEY.format(self.user.id))
+        url = reverse("posts:profile", args=["Replica"])
+        self.assertGreater(self.replica_queries(Client(), "Подписчиков: 1",
+                                                url), 0)
+
+    def test_session_reads_own_writes_from_primary(self):
+        """После своей записи сессия читает из основной базы, пока
+        реплику не скопируют заново."""
+        profile_url = reverse("posts:profile", args=["Replica"])
+        self.client.post(reverse("posts:post_create"), {"text": "Новый"})
+        self.assertEqual(self.replica_queries(self.client, "Новый"), 0)
+        self.assertGreater(self.replica_queries(
+            Client(), "Пост из реплики", profile_url), 0)
+        call_command("sync_replica", stdout=StringIO())
+        self.assertGreater(
+            self.replica_queries(self.client, "Новый", profile_url), 0)
@@ -0,0 +1,62 @@
+import itertools
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+
+from core.thumbnails import prefetch_thumbnails
+
+from .models import Comment
+from .paginator import KeysetPaginator
+
+
+def chunked(iterable, size):
+    """Разбивает поток на списки по `size` элементов."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_page_obj(request, post_list, **kwargs):
+    """Страница ленты по курсору `?after=`/`?before=`.
+
+    Без курсора отдаётся первая страница, тоже без COUNT(*). Номер
+    `?page=` поддерживается только для старых ссылок: ему нужны
+    COUNT(*) и OFFSET, поэтому шаблоны его больше не используют.
+    """
+    paginator = KeysetPaginator(
+        post_list, settings.COUNT_POST_IN_LIST, **kwargs
+    )
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    if after or before:
+        page_obj = paginator.get_cursor_page(after=after, before=before)
+    elif request.GET.get("page"):
+        page_obj = paginator.get_page(request.GET.get("page"))
+    else:
+        page_obj = paginator.first_page()
+    prefetch_thumbnails(post.image for post in page_obj)
+    return page_obj
+
+
+def get_comments_page(post_id, after=None):
+    """Порция комментариев поста после курсора `after`.
+
+    Комментарии идут от старых к новым, страница выбирается по ключу
+    (created, id) без OFFSET и подсчёта, поэтому её стоимость не
+    зависит от числа комментариев.
+    """
+    paginator = KeysetPaginator(
+        Comment.objects.filter(post_id=post_id).select_related("author"),
+        settings.COUNT_COMMENTS_IN_PAGE,
+        ordering=("created", "id"),
+    )
+    if after:
+        try:
+            return paginator.cursor_page(after=after)
+        except (InvalidPage, ValidationError, ValueError):
+            pass
+    return paginator.first_page()
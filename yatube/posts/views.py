@@ -1,33 +1,45 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
-from .forms import CommentForm, PostForm
+from django.views.decorators.http import condition
+
+from core.routers import read_from_replica
+from core.thumbnails import schedule_thumbnails
+
+from .cache import versioned_cache_page
+from .conditional import (feed_etag, page_etag, post_comments_etag,
+                          post_detail_etag, post_state)
+from .counters import get_posts_count
+from .feeds import FOLLOW_FEED_ORDERING, get_follow_feed
+from .follows import get_followers_counts
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Follow, Group, Post, User
+from .search import search_posts
+from .utils import get_comments_page, get_page_obj
 
 
-@cache_page(20)
+@read_from_replica
+@condition(etag_func=feed_etag)
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, page_etag)
 def index(request):
     """Это главная страница соцсети."""
-    post_list = Post.objects.select_related("group", "author")
-    paginator = Paginator(post_list, settings.COUNT_POST_IN_LIST)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         "page_obj": page_obj,
     }
     return render(request, "posts/index.html", context)
 
 
+@read_from_replica
+@condition(etag_func=feed_etag)
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, page_etag)
 def group_posts(request, slug):
     """Это страница с постами, отфильтрованными по группам."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related("group")
-    paginator = Paginator(post_list, settings.COUNT_POST_IN_LIST)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         "page_obj": page_obj,
         "group": group,
@@ -35,37 +47,55 @@ def group_posts(request, slug):
     return render(request, "posts/group_list.html", context)
 
 
+@read_from_replica
+@condition(etag_func=feed_etag)
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, page_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, settings.COUNT_POST_IN_LIST)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    following = True
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            author_id=author.id,
-            user_id=request.user.id).exists()
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    posts_count = get_posts_count(author)
+    post_list = author.posts.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         "page_obj": page_obj,
         "author": author,
-        "following": following,
+        "posts_count": posts_count,
+        "followers_count": get_followers_counts([author.id])[author.id],
     }
     return render(request, "posts/profile.html", context)
 
 
+@read_from_replica
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    """Страница поста; `?after=` — порция комментариев без JavaScript."""
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), id=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
     context = {
         "post": post,
+        "posts_count": get_posts_count(post.author),
         "form": form,
-        "comments": comments,
+        "comments": get_comments_page(post.id, request.GET.get("after")),
     }
     return render(request, "posts/post_detail.html", context)
 
 
+@read_from_replica
+@condition(etag_func=post_comments_etag)
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста HTML-фрагментом."""
+    if post_state(request, post_id) is None:
+        raise Http404
+    context = {
+        "post_id": post_id,
+        "comments": get_comments_page(post_id, request.GET.get("after")),
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -77,6 +107,7 @@ def post_create(request):
         author = request.user
         post.author_id = author.id
         post.save()
+        schedule_thumbnails(post.image)
         return redirect("posts:profile", username=author.username)
     return render(request, "posts/create_post.html", {"form": form})
 
@@ -93,6 +124,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if "image" in form.changed_data:
+            schedule_thumbnails(post.image)
         return redirect(post)
     is_edit = True
     context = {
@@ -116,19 +149,39 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    subscriber = get_object_or_404(User, username=request.user)
-    authors = subscriber.follower.all().values_list('author')
-    post_list = Post.objects.filter(author_id__in=authors)
-    paginator = Paginator(post_list, settings.COUNT_POST_IN_LIST)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    post_list = get_follow_feed(request.user).for_feed()
+    page_obj = get_page_obj(
+        request, post_list, ordering=FOLLOW_FEED_ORDERING)
     context = {
         "page_obj": page_obj,
     }
     return render(request, "posts/follow.html", context)
 
 
+@read_from_replica
+@condition(etag_func=feed_etag)
+@versioned_cache_page(settings.PAGE_CACHE_TIMEOUT, page_etag)
+def search(request):
+    """Поиск по текстам постов с фильтрами по автору и группе."""
+    form = SearchForm(request.GET or None)
+    query = form.cleaned_data["q"] if form.is_valid() else ""
+    post_list = search_posts(query, Post.objects.for_feed())
+    if query:
+        if form.cleaned_data["author"]:
+            post_list = post_list.filter(
+                author__username=form.cleaned_data["author"])
+        if form.cleaned_data["group"]:
+            post_list = post_list.filter(group=form.cleaned_data["group"])
+    page_obj = get_page_obj(request, post_list, ordering=("-rank", "-id"))
+    context = {
+        "form": form,
+        "page_obj": page_obj,
+    }
+    return render(request, "posts/search.html", context)
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -55,7 +55,7 @@ urlpatterns = [
         name="reset_done",
     ),
     path(
-        "reset/<uid64>/<token>/",
+        "reset/<uidb64>/<token>/",
         PasswordResetConfirmView.as_view(
             template_name="users/password_reset_confirm.html",
         ),
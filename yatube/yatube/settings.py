@@ -56,11 +56,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.HolePunchMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -89,6 +92,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "yatube.wsgi.application"
 
+TEST_RUNNER = "core.testing.TestRunner"
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -97,9 +102,43 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # Соединение переживает запрос и не открывается заново.
+        "CONN_MAX_AGE": 60,
     }
 }
 
+# PRAGMA для каждого нового соединения с SQLite (для отдельной базы их
+# можно заменить ключом PRAGMAS). WAL позволяет читать во время записи,
+# а busy_timeout ждёт чужую блокировку вместо ошибки
+# "database is locked". busy_timeout стоит первым: смене журнала тоже
+# нужна блокировка.
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Реплика для чтения лент включается переменной окружения YATUBE_REPLICA
+# с путём к файлу SQLite; локально её обновляет команда sync_replica.
+if os.environ.get("YATUBE_REPLICA"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["YATUBE_REPLICA"],
+        "CONN_MAX_AGE": 60,
+        "PRAGMAS": {**SQLITE_PRAGMAS, "query_only": "ON"},
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
+# На сколько секунд реплика может отстать, чтобы ленты читались из неё.
+# Сессия после своей записи читает из основной базы до следующей
+# синхронизации реплики.
+REPLICA_MAX_LAG = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -149,12 +188,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CASHES = {
+# Общий для всех WSGI-процессов кеш: страницы лент, версии кеша,
+# метаданные миниатюр. Тесты работают со своим кешем в памяти
+# (core.testing.TEST_SETTINGS).
+CACHES = {
     'default': {
-        'BACKEND': 'django.core.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Страницы лент сбрасываются сигналами при изменении постов,
+# комментариев и групп, поэтому время жизни может быть большим.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Карточки постов кешируются по отпечатку содержимого и не устаревают.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
 COUNT_POST_IN_LIST = 10
+COUNT_COMMENTS_IN_PAGE = 20
+
+# Посты авторов с большим числом подписчиков не раздаются по лентам,
+# а читаются при открытии ленты подписок.
+FEED_FANOUT_LIMIT = 1000
+
+# Миниатюры создаются фоновым пулом потоков; пока миниатюра не готова,
+# шаблоны показывают исходное изображение. При 0 миниатюры создаются
+# сразу после коммита в том же потоке.
+THUMBNAIL_WORKERS = 2
+
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x960', {'crop': 'center', 'upscale': True}),
+}
+
+# Загруженные картинки уменьшаются и перекодируются без метаданных.
+IMAGE_MAX_SIZE = (1920, 1920)
+IMAGE_FORMAT = 'WEBP'
+# Формат для анимаций: он должен поддерживать несколько кадров.
+IMAGE_ANIMATED_FORMAT = 'WEBP'
+IMAGE_QUALITY = 80
+IMAGE_KEEP_ORIGINAL = False
+
+# Время SQL, шаблонов и попадания в кеши отдаются в заголовке
+# Server-Timing только при отладке: заголовок раскрывает устройство
+# сайта. В журнал core.timing (см. LOGGING) они пишутся в любом случае.
+SERVER_TIMING = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timing': {
+            'format': '{asctime} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'timing',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'